@@ -1,75 +1,55 @@
 import dash_leaflet as dl
 import geopandas as gpd
-import matplotlib.colors as mcolors
 from dash import html
-from dash_leaflet import Polygon, BaseLayer
 
+from datalake.schema import hexagon_strings
+
+from .cache import LayerCache
+from .hexgrid import GRID_RESOLUTION, PYRAMID_RESOLUTIONS, aggregate_to_resolution, color_key, generate_hex_features, \
+    generate_hex_geojson, grid_bounds, grid_cells, parent_aggregations, resolution_for_zoom, viewport_cells
+from .store import DayHexIndex, HexHistoryStore, MappedModelOutputStore, ModelOutputStore, RollupStore, \
+    consolidate_hex_history, consolidate_model_output
+from .tiles import MAX_TILE_ZOOM, TileCache, covering_tiles, render_tile
 from .utils import *
 
 
-def generate_polys(gdf: gpd.GeoDataFrame, field: str) -> list[Polygon]:
+def generate_hex_colors(gdf: gpd.GeoDataFrame, field: str, column: str = None) -> dict[str, str]:
     """
-    return a list of polys to be passed into a layergroup
+    return a Hexagon_ID -> color mapping for one field, sent to the client to restyle the hex layer
+    :param column: column holding the field's values when it is not named after it, e.g. a rollup aggregate
     """
-    cmap = get_colormap_choice(field)
-
-
-    # Defines a nonlinear scale to adjust the color bar
-    def nonlinear_scale(x):
-        return x ** 0.5
-
-        # We don't want to use this scale for temperature because they are normally distributed - while these other values are right-skewed
-
-
-    nonlinear_fields = [
-        "Normalized Predicted Fire Probability",
-        "Normalized Precipitation (3-Day Average)",
-        "Normalized Snowfall (3-Day Average)",
-        "Normalized Daily Average Wind (3-Day Average)"
-    ]
-
-    polygons: [dl.Polygon] = []
-    for _, row in gdf.iterrows():
-        polygon = row["geometry"]
-        coordinates = [[lat, lon] for lat, lon in polygon.exterior.coords]
-        value = row[field]  # Field value for the polygon
+    colors = map_field_colors(gdf[column or field], field)
+    return dict(zip(hexagon_strings(gdf["Hexagon_ID"]), colors.tolist()))
 
-        # Apply nonlinear transformation only to selected fields 
-        if field in nonlinear_fields:
-            transformed_value = nonlinear_scale(value)
-        else:
-            transformed_value = value
 
-            # Get color based on the (possibly nonlinear) transformed value
-        color = mcolors.to_hex(cmap(transformed_value))
-
-        polygons.append(
-            dl.Polygon(positions=coordinates, color=color, fillColor=color, fillOpacity=0.6,
-                       weight=1, )
-        )
-    return polygons
+def generate_hex_layer(geojson: dict) -> dl.GeoJSON:
+    """
+    return the hexagon grid layer. The geometry is only sent once, date and field changes update its hideout and
+    the hexStyle function in assets/hex_style.js colors each feature by its Hexagon_ID
+    """
+    return dl.GeoJSON(
+        data=geojson,
+        id="hex-layer",
+        style={"variable": "dashExtensions.default.hexStyle"},
+        hideout={"colors": {}}
+    )
 
 
-def generate_layers(gdf: gpd.GeoDataFrame, date_str: str, active_layer: str = None) -> list[dl.BaseLayer]:
-    # print(f"Generating layers {date_str} ({active_layer} is selected)")
+def generate_layers(active_layer: str = None) -> list[dl.BaseLayer]:
+    """
+    return one base layer per field, the layer control only acts as the field selector for the hex layer
+    """
     overlays: list[dl.BaseLayer] = []
     for i, field in enumerate(field_identifiers):
         # Takes off the word normalized for display
         display_name = field.replace("Normalized ", "")
-        polys = generate_polys(gdf, field)
-
-        poly_layer = dl.FeatureGroup(
-            polys,
-            interactive=True,
-            id=f"group-{field}-{date_str}"
-        )
 
         # Select currently active layer. If None, use the first layer
         checked = (display_name == active_layer) if active_layer else (i == 0)
         overlay = dl.BaseLayer(
-            poly_layer,
+            dl.LayerGroup(),
             name=display_name,
-            id=f"overlay-{field}-{date_str}",
+            id=f"overlay-{field}",
             checked=checked
         )
 
@@ -78,41 +58,25 @@ def generate_layers(gdf: gpd.GeoDataFrame, date_str: str, active_layer: str = No
     return overlays
 
 
+def get_field_identifier(active_layer: str = None) -> str:
+    """
+    return the field shown by a base layer name, the first field if no layer is selected yet
+    """
+    if not active_layer:
+        return field_identifiers[0]
+    # Have to re-add the word Normalized so it works within the _viz_helpers.py framework
+    return "Normalized " + active_layer
+
+
 def generate_colorbar(field, n_ticks):
     # Remove "Normalized" part of the field name for the colorbar
     display_name = field.replace("Normalized ", "")
 
-    cmap = get_colormap_choice(field)
     min_val, max_val = get_field_range(field)
 
-
-    # Nonlinear scale (same as for colorbar)
-    def nonlinear_scale(x):
-        return x ** 0.5  # You can adjust this function (e.g., to loglike_scale if needed)
-
-
-    # Don't scale for temperature fields
-    nonlinear_fields = [
-        "Normalized Predicted Fire Probability",
-        "Normalized Precipitation (3-Day Average)",
-        "Normalized Snowfall (3-Day Average)",
-        "Normalized Daily Average Wind (3-Day Average)"
-    ]
-
-    n_grad_steps = 24
-    steps = []
-
     # Apply the nonlinear transformation back to the selected fields with 24 steps
-    for i in range(n_grad_steps):
-        value = i / (n_grad_steps - 1)
-        if field in nonlinear_fields:
-            transformed_value = nonlinear_scale(value)
-        else:
-            transformed_value = value
-            # Get color based on the transformed value
-        steps.append(cmap(transformed_value))
-
-    hex_colors = [mcolors.to_hex(c) for c in steps]
+    n_grad_steps = 24
+    hex_colors = map_field_colors(np.linspace(0, 1, n_grad_steps), field).tolist()
     gradient = f'linear-gradient(to right, {", ".join(hex_colors)})'
 
     # The gradient bar styling
@@ -0,0 +1,173 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+
+class LayerCache:
+    """
+    Cache for rendered layer payloads keyed by (date string, field).
+    The first tier is an in-process LRU with an optional TTL. The optional second tier is a SQLite file shared by
+    every gunicorn worker, it also keeps request counts so the most requested dates can be warmed on startup.
+    Payloads stored on disk must be JSON serializable and are only served to workers of the same version.
+    """
+
+    def __init__(self, max_size=256, ttl=None, disk_path=None, version='', flush_interval=30):
+        """
+        :param max_size: number of payloads kept in memory
+        :param ttl: seconds a payload stays valid, None keeps it until it is evicted
+        :param disk_path: SQLite file for the shared tier, None disables it
+        :param version: version of the data the payloads are rendered from, payloads of other versions on disk are
+            dropped so a redeploy does not serve stale layers
+        :param flush_interval: seconds request counts are gathered in memory before they are added to the shared tier
+        """
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl or None
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.version = str(version)
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.requests = Counter()
+        self._pending = Counter()
+        self._flushed = time.monotonic()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        if self.disk_path is not None:
+            atexit.register(self.flush_requests)
+
+    def get_or_render(self, date_str: str, field: str, render, count=True):
+        """
+        Returns the cached payload for (date_str, field), calling render() and caching its result on a miss
+        :param count: whether this call counts as a user request for most_requested_dates
+        """
+        key = (date_str, field)
+        now = time.time()
+        with self._lock:
+            if count:
+                self.requests[key] += 1
+                self._pending[key] += 1
+                if time.monotonic() - self._flushed > self.flush_interval:
+                    self._flush_requests()
+            if key in self._memory:
+                created, payload = self._memory[key]
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._memory[key]
+
+            payload = self._disk_get(key, now)
+            if payload is not None:
+                self.disk_hits += 1
+                self._remember(key, payload, now)
+                return payload
+            self.misses += 1
+
+        payload = render()
+
+        with self._lock:
+            self._remember(key, payload, now)
+            self._disk_put(key, payload, now)
+        return payload
+
+    def most_requested_dates(self, n: int) -> list[str]:
+        """
+        Returns the n most requested dates, using the shared request counts when the disk tier is enabled
+        """
+        if self.disk_path is None:
+            counts = Counter()
+            for (date_str, _), count in self.requests.items():
+                counts[date_str] += count
+            return [date_str for date_str, _ in counts.most_common(n)]
+        with self._lock:
+            self._flush_requests()
+            rows = self._db().execute(
+                'SELECT date, SUM(count) AS total FROM requests GROUP BY date ORDER BY total DESC LIMIT ?',
+                (n,)).fetchall()
+        return [row[0] for row in rows]
+
+    def flush_requests(self):
+        """
+        Adds the request counts gathered since the last flush to the shared tier, also called on exit
+        """
+        with self._lock:
+            self._flush_requests()
+
+    def warm(self, date_strs: list[str], fields: list[str], render):
+        """
+        Renders every (date, field) pair that is not cached yet, render is called as render(date_str, field)
+        """
+        for date_str in date_strs:
+            for field in fields:
+                self.get_or_render(date_str, field, lambda: render(date_str, field), count=False)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'size': len(self._memory),
+                'max_size': self.max_size, 'ttl': self.ttl, 'disk': str(self.disk_path) if self.disk_path else None}
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key, payload, now):
+        self._memory[key] = (now, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _db(self) -> sqlite3.Connection:
+        """
+        Opens the SQLite tier once per process, connections must not be shared across a gunicorn fork
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            columns = [row[1] for row in self._connection.execute('PRAGMA table_info(layers)')]
+            if columns and 'version' not in columns:
+                # Written before payloads were versioned, they cannot be trusted
+                self._connection.execute('DROP TABLE layers')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS layers (version TEXT, date TEXT, field TEXT, '
+                                     'created REAL, payload TEXT, PRIMARY KEY (version, date, field))')
+            self._connection.execute('DELETE FROM layers WHERE version != ?', (self.version,))
+            self._connection.execute('CREATE TABLE IF NOT EXISTS requests (date TEXT, field TEXT, count INTEGER, '
+                                     'PRIMARY KEY (date, field))')
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _disk_get(self, key, now):
+        if self.disk_path is None:
+            return None
+        row = self._db().execute('SELECT created, payload FROM layers WHERE version = ? AND date = ? AND field = ?',
+                                 (self.version, *key)).fetchone()
+        if row is None or self._expired(row[0], now):
+            return None
+        return json.loads(row[1])
+
+    def _disk_put(self, key, payload, now):
+        if self.disk_path is None:
+            return
+        self._db().execute('INSERT OR REPLACE INTO layers VALUES (?, ?, ?, ?, ?)',
+                           (self.version, *key, now, json.dumps(payload)))
+
+    def _flush_requests(self):
+        """
+        Writes the pending request counts in one transaction, the caller holds the lock
+        """
+        pending, self._pending = self._pending, Counter()
+        self._flushed = time.monotonic()
+        if self.disk_path is None or not pending:
+            return
+        db = self._db()
+        db.execute('BEGIN')
+        db.executemany('INSERT INTO requests VALUES (?, ?, ?) ON CONFLICT (date, field) '
+                       'DO UPDATE SET count = count + excluded.count', [(*key, n) for key, n in pending.items()])
+        db.execute('COMMIT')
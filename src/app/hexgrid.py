@@ -0,0 +1,137 @@
+import math
+from functools import lru_cache
+
+import h3
+import numpy as np
+import pandas as pd
+from h3.api import basic_int as h3_int
+
+# Same grid as Datalake.generate_hexes, the model only produces values for these cells
+GRID_RESOLUTION = 3
+GRID_CENTER = (44, -103)
+GRID_RING_SIZE = 25
+# Lowest map zoom each resolution of the pyramid is drawn from. One H3 resolution is ~2.6 times finer and one zoom
+# level 2 times, so a hexagon stays roughly the same size on screen. Resolutions coarser than the grid average the
+# model output of their children, finer ones are colored by their parent in the grid.
+ZOOM_RESOLUTIONS = {2: 0, 3: 4, 4: 6, 5: 7, 6: 9}
+PYRAMID_RESOLUTIONS = list(ZOOM_RESOLUTIONS)
+
+
+def resolution_for_zoom(zoom) -> int:
+    """
+    Resolution of the hexagons drawn at a map zoom level, the grid's resolution while the zoom is not known yet
+    """
+    if zoom is None:
+        return GRID_RESOLUTION
+    return max([resolution for resolution, min_zoom in ZOOM_RESOLUTIONS.items() if zoom >= min_zoom],
+               default=PYRAMID_RESOLUTIONS[0])
+
+
+@lru_cache(maxsize=None)
+def grid_cells(resolution: int = GRID_RESOLUTION) -> frozenset:
+    """
+    Cells of the grid at its resolution, or the parents of its cells at a coarser one
+    """
+    cells = h3.grid_disk(h3.latlng_to_cell(*GRID_CENTER, GRID_RESOLUTION), GRID_RING_SIZE)
+    return frozenset(h3.cell_to_parent(cell, resolution) for cell in cells)
+
+
+@lru_cache(maxsize=None)
+def grid_bounds() -> tuple[tuple[float, float], tuple[float, float]]:
+    """
+    ((south, west), (north, east)) edges of the grid
+    """
+    points = np.array([point for cell in grid_cells() for point in h3.cell_to_boundary(cell)])
+    return (points[:, 0].min(), points[:, 1].min()), (points[:, 0].max(), points[:, 1].max())
+
+
+def color_key(cell: str) -> str:
+    """
+    Hexagon_ID the colors of a drawn cell are looked up by: the cell itself, or its parent in the grid when it is
+    finer than the model output
+    """
+    if h3.get_resolution(cell) > GRID_RESOLUTION:
+        return h3.cell_to_parent(cell, GRID_RESOLUTION)
+    return cell
+
+
+def viewport_cells(resolution: int, bounds=None) -> list[str]:
+    """
+    Sorted cells of the grid at a resolution of the pyramid whose center lies within the map bounds. The bounds are
+    padded by one hexagon radius so hexagons cut by the edge of the map are kept.
+    :param bounds: [[south, west], [north, east]] as reported by the map, the whole grid when None
+    """
+    return list(_viewport_cells(resolution, tuple(map(tuple, bounds)) if bounds is not None else None))
+
+
+def generate_hex_features(cells) -> list[dict]:
+    """
+    Returns the GeoJSON features of hexagons of the pyramid, each carries the Hexagon_ID its color is looked up by
+    """
+    return [_hex_feature(cell) for cell in cells]
+
+
+def generate_hex_geojson(resolution: int = GRID_RESOLUTION, bounds=None) -> dict:
+    """
+    Returns the hexagons of the grid drawn at a resolution within the map bounds as a GeoJSON FeatureCollection.
+    Date and field changes only restyle it.
+    :param bounds: [[south, west], [north, east]] as reported by the map, the whole grid when None
+    """
+    return {'type': 'FeatureCollection', 'features': generate_hex_features(viewport_cells(resolution, bounds))}
+
+
+def parent_aggregations(columns) -> dict:
+    """
+    How the values of the children of a coarser cell are combined: the mean, except a fire in any child counts
+    for its parent
+    """
+    return {column: 'max' if column == 'Fire Occurred?' else 'mean' for column in columns}
+
+
+def aggregate_to_resolution(df: pd.DataFrame, resolution: int) -> pd.DataFrame:
+    """
+    Model output of one day or period at a resolution coarser than the grid, one row per parent cell
+    :param df: model output rows of the grid cells, Hexagon_ID as uint64
+    """
+    codes, uniques = pd.factorize(df['Hexagon_ID'].to_numpy())
+    parents = np.array([h3_int.cell_to_parent(int(cell), resolution) if cell else 0 for cell in uniques],
+                       dtype=np.uint64)
+    values = df.select_dtypes('number').drop(columns='Hexagon_ID')
+    aggregated = values.groupby(parents[codes], sort=True).agg(parent_aggregations(values.columns))
+    return aggregated.rename_axis('Hexagon_ID').reset_index()
+
+
+@lru_cache(maxsize=256)
+def _viewport_cells(resolution: int, bounds) -> tuple[str, ...]:
+    """
+    Cached viewport_cells, the layer callback looks up the viewport it drew last besides the current one
+    """
+    (south, west), (north, east) = grid_bounds()
+    if bounds is not None:
+        (view_south, view_west), (view_north, view_east) = bounds
+        south, west, north, east = max(south, view_south), max(west, view_west), \
+            min(north, view_north), min(east, view_east)
+
+    pad_lat = h3.average_hexagon_edge_length(resolution, unit='km') / 111.32
+    pad_lng = pad_lat / math.cos(math.radians(min(max(abs(south), abs(north)), 85)))
+    south, west, north, east = south - pad_lat, west - pad_lng, north + pad_lat, east + pad_lng
+    if south >= north or west >= east:
+        return ()
+
+    cells = h3.polygon_to_cells(h3.LatLngPoly([(south, west), (south, east), (north, east), (north, west)]),
+                                resolution)
+    grid = grid_cells(min(resolution, GRID_RESOLUTION))
+    return tuple(sorted(cell for cell in cells if color_key(cell) in grid))
+
+
+@lru_cache(maxsize=2 ** 16)
+def _hex_feature(cell: str) -> dict:
+    # h3 returns (lat, lng) pairs but GeoJSON rings are (lng, lat) and must be closed
+    ring = [[round(lng, 5), round(lat, 5)] for lat, lng in h3.cell_to_boundary(cell)]
+    ring.append(ring[0])
+    return {
+        'type': 'Feature',
+        'id': cell,
+        'properties': {'Hexagon_ID': color_key(cell)},
+        'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+    }
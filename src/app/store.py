@@ -0,0 +1,364 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import h3
+
+from datalake.rollup import period_start
+from datalake.schema import compact_model_output, hexagon_ints
+
+
+
+def _as_date(day) -> date:
+    """
+    Normalize a date, datetime, pandas timestamp or 'YYYY-MM-DD' string to a date
+    """
+    if isinstance(day, str):
+        return date.fromisoformat(day)
+    if isinstance(day, datetime):
+        return day.date()
+    return day
+
+
+class DayHexIndex:
+    """
+    Row lookups over a frame sorted by date, built once when the frame is loaded.
+    Maps each day to a row slice and each (day, Hexagon_ID) pair to a row position so callbacks never scan the frame.
+    """
+
+    def __init__(self, day_slices: dict, cell_rows: dict):
+        self.day_slices = day_slices
+        self.cell_rows = cell_rows
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'DayHexIndex':
+        """
+        Builds the index, df must already be sorted by its 'date' column
+        """
+        days = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+        hex_ids = df['Hexagon_ID'].to_numpy()
+        if len(days) > 1 and (days[1:] < days[:-1]).any():
+            raise ValueError("Frame must be sorted by date before it is indexed")
+
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(days)]
+
+        day_slices = {}
+        cell_rows = {}
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            day = days[start].item()
+            day_slices[day] = slice(start, stop)
+            cell_rows.update(((day, hex_id), position) for position, hex_id in enumerate(hex_ids[start:stop], start))
+        return cls(day_slices, cell_rows)
+
+    def day(self, day: date) -> slice:
+        """
+        Row slice for a day, empty when the day is not indexed
+        """
+        return self.day_slices.get(day, slice(0, 0))
+
+    def cell(self, day: date, hex_id: int) -> list[int]:
+        """
+        Row positions for a hexagon on a day, empty when it is not indexed
+        """
+        position = self.cell_rows.get((day, hex_id))
+        return [] if position is None else [position]
+
+
+class ModelOutputStore:
+    """
+    Date partitioned access to the Model_Output_YYYY-MM-DD.parquet files.
+    The directory is only indexed on startup, a day is read from disk the first time it is requested and then kept
+    in a bounded LRU cache so memory use does not depend on how many days are deployed.
+    Each cached day carries a DayHexIndex so cell lookups are a hash probe instead of a mask over the frame.
+    """
+    partition_pattern = re.compile(r'Model_Output_(\d{4}-\d{2}-\d{2})\.parquet$')
+
+    def __init__(self, root_path, cache_size=32):
+        self.root_path = Path(root_path)
+        self.cache_size = max(1, int(cache_size))
+        self.partitions = self._index_partitions()
+        self.dates = sorted(self.partitions)
+        self.version = self._version()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._empty = None
+        self._dataset = None
+
+    @property
+    def min_date(self) -> date:
+        return self.dates[0]
+
+    @property
+    def max_date(self) -> date:
+        return self.dates[-1]
+
+    def get_day(self, day) -> gpd.GeoDataFrame:
+        """
+        Returns every hexagon for a single day. Days without a partition return an empty frame.
+        :param day: date, datetime or 'YYYY-MM-DD' string
+        """
+        day = _as_date(day)
+        gdf, index = self._load(day)
+        return gdf.iloc[index.day(day)]
+
+    def get_cell(self, day, hex_id: str) -> gpd.GeoDataFrame:
+        """
+        Returns the rows of a single hexagon on a single day
+        :param day: date, datetime or 'YYYY-MM-DD' string
+        :param hex_id: H3 cell id
+        """
+        day = _as_date(day)
+        gdf, index = self._load(day)
+        return gdf.iloc[index.cell(day, h3.str_to_int(hex_id))]
+
+    def get_history(self, hex_ids: list[str], columns=None) -> pd.DataFrame:
+        """
+        Returns every day of some hexagons sorted by date, read with one scan over the partitions filtered on
+        Hexagon_ID without going through the day cache. This is the fallback when no hex-major history file (see
+        consolidate_hex_history) is deployed.
+        :param hex_ids: H3 cell ids
+        :param columns: value columns to read besides 'date', all of them when not given
+        """
+        if self._dataset is None:
+            self._dataset = ds.dataset([str(path) for path in self.partitions.values()], format='parquet')
+        # Partitions written before the compact schema hold Hexagon_ID as strings
+        if pa.types.is_integer(self._dataset.schema.field('Hexagon_ID').type):
+            cells = hexagon_ints(hex_ids)
+        else:
+            cells = pa.array(hex_ids, pa.string())
+        table = self._dataset.to_table(columns=None if columns is None else ['Hexagon_ID', 'date', *columns],
+                                       filter=pc.field('Hexagon_ID').isin(cells))
+        return _history_frame(compact_model_output(table), columns)
+
+    def cache_info(self) -> dict:
+        return {'partitions': len(self.partitions), 'cached': len(self._cache), 'cache_size': self.cache_size}
+
+    def _load(self, day: date) -> tuple[gpd.GeoDataFrame, DayHexIndex]:
+        """
+        Returns the partition holding a day and its index, reading and indexing it on a cache miss
+        """
+        with self._lock:
+            if day in self._cache:
+                self._cache.move_to_end(day)
+                return self._cache[day]
+
+        if day not in self.partitions:
+            return self._empty_day()
+
+        gdf = self._read_partition(day).sort_values(['date', 'Hexagon_ID'], kind='stable')
+        entry = (gdf, DayHexIndex.from_frame(gdf))
+
+        with self._lock:
+            self._cache[day] = entry
+            self._cache.move_to_end(day)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _read_partition(self, day: date) -> pd.DataFrame:
+        # Older partitions are cast to the compact schema the scoring pipeline writes
+        return compact_model_output(pq.read_table(self.partitions[day])).to_pandas(date_as_object=False)
+
+    def _index_partitions(self) -> dict:
+        """
+        Maps each date to its parquet file using only the file names
+        """
+        partitions = {}
+        for path in sorted(self.root_path.glob('*.parquet')):
+            match = self.partition_pattern.search(path.name)
+            if match is None:
+                print(f"[app.store.{type(self).__name__}] Skipping {path.name}, "
+                      f"expected {self.partition_pattern.pattern}")
+                continue
+            partitions[date.fromisoformat(match.group(1))] = path
+        if not partitions:
+            raise FileNotFoundError(f"No model output partitions found in {self.root_path}")
+        return partitions
+
+    def _version(self) -> int:
+        """
+        Latest modification time of the partitions in seconds, it changes whenever a day is added or rescored
+        """
+        return max(int(path.stat().st_mtime) for path in self.partitions.values())
+
+    def _empty_day(self) -> tuple[gpd.GeoDataFrame, DayHexIndex]:
+        if self._empty is None:
+            self._empty = (self._read_partition(self.min_date).iloc[0:0], DayHexIndex({}, {}))
+        return self._empty
+
+
+class RollupStore(ModelOutputStore):
+    """
+    Week, month or season aggregates of the model output written by Datalake.process_rollups, one small partition
+    per period named after its first day. Any day of a period returns that period's rows, so the map renders an
+    aggregate the same way and as fast as a single day.
+    """
+    partition_pattern = re.compile(r'Rollup_(\d{4}-\d{2}-\d{2})\.parquet$')
+
+    def __init__(self, root_path, granularity, cache_size=32):
+        """
+        :param root_path: directory holding the rollups/<granularity>/ partitions
+        :param granularity: 'week', 'month' or 'season'
+        """
+        self.granularity = granularity
+        super().__init__(Path(root_path) / 'rollups' / granularity, cache_size)
+
+    def get_day(self, day) -> pd.DataFrame:
+        """
+        Returns every hexagon of the period holding a day
+        """
+        return super().get_day(self.period_start(day))
+
+    def get_cell(self, day, hex_id: str) -> pd.DataFrame:
+        return super().get_cell(self.period_start(day), hex_id)
+
+    def period_start(self, day) -> date:
+        return period_start(_as_date(day), self.granularity).date()
+
+
+class MappedModelOutputStore(ModelOutputStore):
+    """
+    ModelOutputStore backed by a single consolidated Arrow IPC file (see consolidate_model_output).
+    The file is memory-mapped, so every gunicorn worker shares the same pages through the OS page cache instead of
+    holding its own copy, only the days in the LRU cache are converted to pandas.
+    """
+
+    def __init__(self, path, cache_size=32):
+        self.table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+        super().__init__(path, cache_size)
+
+    def _read_partition(self, day: date) -> pd.DataFrame:
+        rows = self.partitions[day]
+        return compact_model_output(self.table.slice(rows.start, rows.stop - rows.start)).to_pandas(
+            date_as_object=False)
+
+    def _index_partitions(self) -> dict:
+        """
+        Maps each date to its row slice, the file is sorted by date so this only reads the date column
+        """
+        days = self.table.column('date').cast(pa.timestamp('ns')).to_numpy().astype('datetime64[D]')
+        if len(days) == 0:
+            raise FileNotFoundError(f"No model output found in {self.root_path}")
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+        stops = np.r_[starts[1:], len(days)]
+        return {days[start].item(): slice(start, stop) for start, stop in zip(starts.tolist(), stops.tolist())}
+
+    def get_history(self, hex_ids: list[str], columns=None) -> pd.DataFrame:
+        table = self.table.filter(pc.is_in(self.table.column('Hexagon_ID'), value_set=hexagon_ints(hex_ids)))
+        return _history_frame(compact_model_output(table), columns)
+
+    def _version(self) -> int:
+        return int(self.root_path.stat().st_mtime)
+
+
+class HexHistoryStore:
+    """
+    Full history of single hexagons, read from a hex-major copy of the model output sorted by Hexagon_ID and date
+    (see consolidate_hex_history). The file is memory-mapped and the rows of each hexagon are one contiguous slice
+    found through a dict built on startup, so a lookup reads the same few pages however many days are deployed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+        self.cells = self._index_cells()
+        self.max_date = pc.max(self.table.column('date')).as_py() if len(self.table) else None
+
+    def get_history(self, hex_ids: list[str], columns=None) -> pd.DataFrame:
+        """
+        Returns every day of some hexagons sorted by date, empty when none of them has model output. Each hexagon
+        is one slice of the file.
+        :param hex_ids: H3 cell ids
+        :param columns: value columns to read besides 'date', all of them when not given
+        """
+        slices = [self.cells.get(h3.str_to_int(hex_id), slice(0, 0)) for hex_id in hex_ids] or [slice(0, 0)]
+        table = pa.concat_tables([self.table.slice(rows.start, rows.stop - rows.start) for rows in slices])
+        if len(slices) == 1:
+            if columns is not None:
+                table = table.select(['date', *columns])
+            return table.to_pandas(date_as_object=False)
+        return _history_frame(table, columns)
+
+    def _index_cells(self) -> dict:
+        """
+        Maps each Hexagon_ID to its row slice, the file is sorted by Hexagon_ID so this only reads that column
+        """
+        cells = self.table.column('Hexagon_ID').to_numpy()
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]]) if len(cells) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(cells)]
+        return {cells[start].item(): slice(start, stop) for start, stop in zip(starts.tolist(), stops.tolist())}
+
+
+def _history_frame(table: pa.Table, columns=None) -> pd.DataFrame:
+    """
+    Model output rows of some hexagons in date order, only 'date' and the given columns when columns are given
+    """
+    history = table.sort_by([('date', 'ascending'), ('Hexagon_ID', 'ascending')]).to_pandas(date_as_object=False)
+    return history[['date', *columns]] if columns is not None else history
+
+
+def consolidate_model_output(root_path, output_path) -> Path:
+    """
+    Writes every Model_Output_YYYY-MM-DD.parquet partition into one uncompressed Arrow IPC file sorted by date and
+    Hexagon_ID that MappedModelOutputStore can memory-map, in the compact model output schema. Geometry is dropped,
+    the map builds it from the H3 grid.
+    :param root_path: directory holding the parquet partitions
+    :param output_path: Arrow IPC (Feather v2) file to write
+    """
+    output_path = Path(output_path)
+    partitions = ModelOutputStore(root_path, cache_size=1).partitions
+    days = sorted(partitions)
+
+    schema = compact_model_output(pq.read_table(partitions[days[0]]).slice(0, 0)).schema
+
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for day in days:
+            table = compact_model_output(pq.read_table(partitions[day])).select(schema.names).cast(schema)
+            table = table.sort_by([('date', 'ascending'), ('Hexagon_ID', 'ascending')])
+            writer.write_table(table)
+    tmp_path.replace(output_path)
+
+    print(f'Consolidated {len(days)} days into {output_path}')
+    return output_path
+
+
+def consolidate_hex_history(store: ModelOutputStore, output_path, columns=None) -> Path:
+    """
+    Writes the model output of every day in a store into one uncompressed Arrow IPC file sorted by Hexagon_ID and
+    date, the hex-major layout HexHistoryStore slices a hexagon's whole history from.
+    :param store: model output to copy, either store type
+    :param output_path: Arrow IPC (Feather v2) file to write
+    :param columns: value columns to keep besides Hexagon_ID and date, all of them when not given
+    """
+    output_path = Path(output_path)
+    tables = []
+    for day in store.dates:
+        df = store.get_day(day)
+        if columns is not None:
+            df = df[['Hexagon_ID', 'date', *columns]]
+        tables.append(pa.Table.from_pandas(df, preserve_index=False))
+    table = compact_model_output(pa.concat_tables(tables, promote_options='permissive'))
+    table = table.sort_by([('Hexagon_ID', 'ascending'), ('date', 'ascending')]).combine_chunks()
+
+    # Written under a per-process name and renamed, a running dashboard never opens a partially written file
+    tmp_path = output_path.with_name(f'{output_path.name}.{os.getpid()}.tmp')
+    with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    tmp_path.replace(output_path)
+
+    print(f'Wrote the history of {len(np.unique(table["Hexagon_ID"].to_numpy()))} hexagons over {len(store.dates)} '
+          f'days to {output_path}')
+    return output_path
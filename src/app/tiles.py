@@ -0,0 +1,110 @@
+import io
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+import h3
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from .hexgrid import color_key, grid_bounds, resolution_for_zoom, viewport_cells
+
+TILE_SIZE = 256
+# Deepest zoom tiles are rendered for, the finest resolution of the pyramid is drawn from zoom 9
+MAX_TILE_ZOOM = 12
+# Matches the fillOpacity of hexStyle in assets/hex_style.js
+FILL_ALPHA = round(0.6 * 255)
+
+
+def tile_bounds(z: int, x: int, y: int) -> list[list[float]]:
+    """
+    [[south, west], [north, east]] of a Web Mercator tile, the bounds format the map reports
+    """
+    n = 2 ** z
+    west, east = x / n * 360 - 180, (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return [[south, west], [north, east]]
+
+
+def covering_tiles(z: int, bounds=None) -> list[tuple[int, int]]:
+    """
+    (x, y) of every tile at a zoom level intersecting the bounds, the grid's bounds when None
+    """
+    (south, west), (north, east) = bounds if bounds is not None else grid_bounds()
+    n = 2 ** z
+
+    def tile_y(lat):
+        return int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+    xs = range(max(int((west + 180) / 360 * n), 0), min(int((east + 180) / 360 * n), n - 1) + 1)
+    ys = range(max(tile_y(north), 0), min(tile_y(south), n - 1) + 1)
+    return [(x, y) for x in xs for y in ys]
+
+
+def render_tile(colors: dict, z: int, x: int, y: int) -> bytes:
+    """
+    PNG of the hexagons of the pyramid drawn at a zoom level within one tile, colored like the vector hex layer
+    :param colors: Hexagon_ID -> color mapping of the layer at the resolution drawn at z, see generate_hex_colors
+    """
+    image = Image.new('RGBA', (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image, 'RGBA')
+    n = 2 ** z
+    for cell in viewport_cells(resolution_for_zoom(z), tile_bounds(z, x, y)):
+        color = colors.get(color_key(cell))
+        if color is None:
+            continue
+        lat, lng = _cell_boundary(cell)
+        px = ((lng + 180) / 360 * n - x) * TILE_SIZE
+        py = ((1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n - y) * TILE_SIZE
+        red, green, blue = ImageColor.getrgb(color)[:3]
+        draw.polygon(list(zip(px.tolist(), py.tolist())), fill=(red, green, blue, FILL_ALPHA),
+                     outline=(red, green, blue, 255))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+class TileCache:
+    """
+    On-disk cache of rendered tiles shared by every gunicorn worker, laid out as
+    <root>/<version>/<field>/<layer key>/<z>/<x>/<y>.png. A tile of a layer never changes once written, a redeploy
+    of the model output writes under a new version and the directories of older ones can be deleted.
+    """
+
+    def __init__(self, root, version=''):
+        """
+        :param root: directory shared by every worker
+        :param version: version of the data the tiles are rendered from
+        """
+        self.root = Path(root)
+        self.version = str(version)
+
+    def path(self, field: str, layer: str, z: int, x: int, y: int) -> Path:
+        """
+        File of one tile, the layer key of a rollup holds '/' and becomes nested directories
+        """
+        return self.root.joinpath(self.version, quote(field, safe=''), *layer.split('/'), str(z), str(x),
+                                  f'{y}.png')
+
+    def get_or_render(self, field: str, layer: str, z: int, x: int, y: int, render) -> Path:
+        """
+        Returns the file of a tile, writing render()'s PNG bytes to it first when it is not cached yet
+        """
+        path = self.path(field, layer, z, x, y)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written under a per-process name and renamed, so a worker never serves a partially written tile
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_bytes(render())
+            os.replace(tmp_path, path)
+        return path
+
+
+@lru_cache(maxsize=2 ** 16)
+def _cell_boundary(cell: str) -> tuple[np.ndarray, np.ndarray]:
+    boundary = np.array(h3.cell_to_boundary(cell))
+    return boundary[:, 0], boundary[:, 1]
@@ -33,6 +33,36 @@ _field_formatter_funcs = {
     "Normalized Daily Average Wind (3-Day Average)": lambda s: f"{(s * 0.1 * 2.23694):,.1f} mph",
 }
 
+# Display unit of each field and the conversion from the raw dataset units, used by the hexagon history chart
+_field_units = {
+    "Normalized Predicted Fire Probability": ("probability", lambda s: s),
+    "Normalized Precipitation (3-Day Average)": ("mm", lambda s: s / 10),
+    "Normalized Temperature Maximum (3-Day Average)": ("°F", lambda s: s * 0.18 + 32),
+    "Normalized Temperature Minimum (3-Day Average)": ("°F", lambda s: s * 0.18 + 32),
+    "Normalized Snowfall (3-Day Average)": ("mm", lambda s: s / 10),
+    "Normalized Average Elevation": ("ft", lambda s: s * 3.28084),
+    "Normalized Daily Average Wind (3-Day Average)": ("mph", lambda s: s * 0.1 * 2.23694),
+}
+
+# We don't want to use the sqrt scale for temperature because they are normally distributed - while these other values are right-skewed
+_nonlinear_fields = [
+    "Normalized Predicted Fire Probability",
+    "Normalized Precipitation (3-Day Average)",
+    "Normalized Snowfall (3-Day Average)",
+    "Normalized Daily Average Wind (3-Day Average)"
+]
+
+
+def _build_color_lut(cmap) -> tuple[np.ndarray, str]:
+    """
+    Precomputes the hex color of every entry of a colormap, plus the color used for missing values
+    """
+    lut = np.array([mpl.colors.to_hex(c) for c in cmap(np.arange(cmap.N))])
+    return lut, mpl.colors.to_hex(cmap(np.nan))
+
+
+_field_color_luts = {field: _build_color_lut(cmap) for field, cmap in _field_colormaps.items()}
+
 # Function to get the display name (without 'Normalized')
 def get_display_name(field: str) -> str:
     friendly_names = {
@@ -73,5 +103,36 @@ def format_field_values(x: float, field: str) -> str:
     return fn(x)
 
 
+def convert_field_values(values, field: str) -> tuple[np.ndarray, str]:
+    """
+    Converts raw values of a field to its display unit, returns the converted values and the unit
+    """
+    unit, fn = _field_units.get(field, ("", lambda s: s))
+    return fn(np.asarray(values, dtype=float)), unit
+
 
+def scale_field_values(values, field: str) -> np.ndarray:
+    """
+    Applies the sqrt scale to the right-skewed fields, values are expected to be normalized to [0, 1]
+    """
+    values = np.asarray(values, dtype=float)
+    if field in _nonlinear_fields:
+        return np.sqrt(np.clip(values, 0, None))
+    return values
+
+
+def map_field_colors(values, field: str) -> np.ndarray:
+    """
+    Returns the hex color of every value of a field in one pass over the precomputed colormap lookup table.
+    Binning matches calling the matplotlib colormap on each value.
+    """
+    if field not in _field_color_luts:
+        _field_color_luts[field] = _build_color_lut(get_colormap_choice(field))
+    lut, bad_color = _field_color_luts[field]
 
+    scaled = scale_field_values(values, field)
+    missing = np.isnan(scaled)
+    indices = np.clip(np.nan_to_num(scaled * len(lut)), 0, len(lut) - 1).astype(np.intp)
+    colors = lut[indices]
+    colors[missing] = bad_color
+    return colors
@@ -0,0 +1,33 @@
+window.dash_clientside = window.dash_clientside || {};
+
+window.dash_clientside.hexLayer = {
+    // Applies the changes sent by update_layers_on_date to the features and colors of the hex-layer GeoJSON.
+    // Hexagons leaving the viewport are dropped with their colors, entering ones are added with theirs
+    applyDelta: function(delta, data, hideout) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (!delta) {
+            return [noUpdate, noUpdate];
+        }
+
+        let features = (data && data.features) || [];
+        let geometry = noUpdate;
+        if (delta.reset || delta.add.length || delta.remove.length) {
+            const removed = new Set(delta.remove);
+            features = delta.reset ? [] : features.filter(feature => !removed.has(feature.id));
+            const drawn = new Set(features.map(feature => feature.id));
+            features = features.concat(delta.add.filter(feature => !drawn.has(feature.id)));
+            geometry = {type: 'FeatureCollection', features: features};
+        }
+
+        const keys = new Set(features.map(feature => feature.properties.Hexagon_ID));
+        const previous = (!delta.restyle && hideout && hideout.colors) || {};
+        const colors = {};
+        for (const [key, color] of Object.entries(previous)) {
+            if (keys.has(key)) {
+                colors[key] = color;
+            }
+        }
+        Object.assign(colors, delta.colors);
+        return [geometry, {colors: colors}];
+    }
+};
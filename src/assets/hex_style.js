@@ -0,0 +1,15 @@
+window.dashExtensions = window.dashExtensions || {};
+window.dashExtensions.default = window.dashExtensions.default || {};
+
+// Styles a hexagon of the hex-layer GeoJSON using the Hexagon_ID -> color mapping sent in its hideout.
+// Hexagons finer than the model output carry the Hexagon_ID of their parent
+window.dashExtensions.default.hexStyle = function(feature, context) {
+    const colors = (context.hideout && context.hideout.colors) || {};
+    const color = colors[feature.properties.Hexagon_ID];
+
+    // Hexagons without model output for the selected date are hidden
+    if (color === undefined) {
+        return {stroke: false, fillOpacity: 0};
+    }
+    return {color: color, fillColor: color, fillOpacity: 0.6, weight: 1};
+};
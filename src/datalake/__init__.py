@@ -1,22 +1,89 @@
 import json
+import multiprocessing
 import os
+import resource
+import shutil
 import tempfile
+import time
 import zipfile
-from io import StringIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
 import pyarrow.dataset as ds
 import pyarrow.parquet as pq
-import requests
-from shapely.geometry import shape, Polygon, mapping, Point
-from shapely.validation import make_valid
+import pyogrio
+import shapely
+from pyproj import CRS
+from shapely.geometry import Polygon
 
 import h3
 
+from .conus import ConusIndex
+from .download import Downloader
+from .features import feature_columns, hex_neighbors, impute_from_neighbors, rolling_mean
+from .manifest import Manifest
+from .rollup import granularities, period_days, period_start, rollup_table, rollup_values
+from .schema import compact_ghcnd, compact_model_output, geoparquet_table, hexagon_ints
+from .scoring import ModelScorer, day_starts, min_max_by_day, normalize_probability, output_columns
+
+
+# Stations table of a process_ghcnd_daily worker, loaded once by the parent and handed to each worker on startup
+_daily_stations = None
+
+
+def _init_daily_worker(stations):
+    global _daily_stations
+    _daily_stations = stations
+
+
+def _clean_daily_year(lake, year, stream):
+    """
+    Cleans one year of daily data inside a worker and reports its runtime and the worker's peak memory
+    """
+    start = time.perf_counter()
+    clean = lake.stream_daily_file if stream else lake.clean_daily_file
+    clean(lake.datalake_root / lake.paths["ghcnd_raw_daily"] / f'{year}.csv.gz',
+          lake.datalake_root / lake.paths["ghcnd_clean_daily"] / f'{year}.parquet', stations=_daily_stations)
+    return {'seconds': time.perf_counter() - start,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+@lru_cache(maxsize=None)
+def _hex_grid(resolution, center_lat, center_lng, ring_size):
+    """
+    Set of the H3 cells in the hexagon grid, built once per process
+    """
+    return frozenset(h3.grid_disk(h3.latlng_to_cell(center_lat, center_lng, resolution), ring_size))
+
 
 class Datalake:
+    # Hexagon grid every observation is assigned to
+    #The input lat and lng are where the grid is centered - this can be moved to any lat, long - for example, over Califonia (lng = -119.45, lat = 37.17)
+    hex_center = (44, -103)
+    # Generate H3 hexagons at a specified resolution - a larger resolution means smaller cell size
+    hex_resolution = 3
+    # Indicate the number of rings around the central hexagon - larger ring size means more area of the map will be covered
+    hex_ring_size = 25
+    # Recorded in the build manifest, bump it when a change to the cleaning code should rebuild existing outputs
+    code_version = '2'
+    # Rows per row group of the curated daily layout, small enough that a single hexagon only touches a few groups
+    curated_row_group_size = 128 * 1024
+    # Missing hexagon-day values are imputed from the cells this many rings away, 0 disables imputation
+    feature_neighbor_rings = 1
+    # Days scored per predict_proba call by process_model_output
+    scoring_batch_days = 92
+    # Rows per row group of the clean fire GeoParquet files, each group's bbox statistics cover a small area
+    geoparquet_row_group_size = 16 * 1024
+    # Curated daily files are partitioned by these directories, e.g. curated/ghcnd/daily/year=2020/month=7/
+    curated_partitioning = ds.partitioning(pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive')
 
     def __init__(self, root_path):
 
@@ -25,18 +92,24 @@ class Datalake:
                       "ghcnd_clean_stations": "clean/ghcnd/stations.parquet",
                       "ghcnd_metadata": "clean/ghcnd/metadata.html", "ghcnd_clean_daily": "clean/ghcnd/daily/",
                       "ghcnd_statistics": "curated/ghcnd/statistics.parquet",
+                      "ghcnd_curated_daily": "curated/ghcnd/daily/",
+                      "ghcnd_curated_stations": "curated/ghcnd/stations.parquet",
+                      "features": "curated/features/",
+                      "hex_geometry": "curated/hexagons.parquet",
                       "fire_point_raw": "raw/fire_occurrence_point/National_USFS_Fire_Occurrence_Point_(Feature_Layer).geojson",
                       "fire_point_clean": "clean/fire_occurrence_point/Fire_Occurence.parquet",
                       "fire_perimeter_raw": "raw/fire_perimeter/National_USFS_Fire_Perimeter_(Feature_Layer).geojson",
                       "fire_perimeter_cleaned": "clean/fire_perimeter/National_USFS_Fire_Perimeter_(Feature_Layer).parquet",
                       "states_raw": "raw/maps/cb_2023_us_all_500k.zip",
-                      "states_clean": "clean/maps/cb_2023_us_states_500k.parquet", }
+                      "states_clean": "clean/maps/cb_2023_us_states_500k.parquet",
+                      "manifest": "manifest.json", }
         self.ghcnd_elements = ['PRCP', 'SNOW', 'SNWD', 'TMAX', 'TMIN', 'AWND', 'AWDR', 'EVAP']
         self.ghcnd_sources = {"readme": "https://docs.opendata.aws/noaa-ghcn-pds/readme.html",
                               "stations": "https://noaa-ghcn-pds.s3.amazonaws.com/ghcnd-stations.txt",
                               "inventory": "https://noaa-ghcn-pds.s3.amazonaws.com/ghcnd-inventory.txt",
                               "bucket": "https://noaa-ghcn-pds.s3.amazonaws.com"}
         self.years = (2000, 2025)
+        self.manifest = Manifest(self.datalake_root, self.code_version, self.paths["manifest"])
 
     def initialize(self):
         self._create_subdirectory('raw')
@@ -51,37 +124,144 @@ class Datalake:
         self._create_subdirectory('clean/fire_perimeter')
 
     def query_ghcnd(self, pyarrow_query, columns=None):
+        """
+        Queries the daily GHCN-D observations. Reads the curated layout when it has been built, so year/month
+        filters prune whole partitions and Hexagon_ID/date filters skip row groups using their statistics.
+        Geometry is joined back from the curated stations table by station_id.
+        """
         if columns and 'geometry' not in columns:
             return ValueError("Columns list is provided but does not contain 'geometry'!")
-        else:
+        curated_path = self.datalake_root / self.paths["ghcnd_curated_daily"]
+        if not curated_path.exists():
             dataset = ds.dataset(self.datalake_root / self.paths["ghcnd_clean_daily"])
             return gpd.GeoDataFrame.from_arrow(dataset.filter(pyarrow_query).to_table(columns=columns)).set_crs(
                 epsg=4326)
 
+        dataset = ds.dataset(curated_path, format='parquet', partitioning=self.curated_partitioning)
+        if columns is None:
+            columns = self._curated_column_order(dataset.schema.names)
+        read_columns = list(dict.fromkeys(['station_id'] + [column for column in columns if column != 'geometry']))
+        table = dataset.to_table(columns=read_columns, filter=pyarrow_query)
+
+        stations = pq.read_table(self.datalake_root / self.paths["ghcnd_curated_stations"],
+                                 columns=['station_id', 'geometry'])
+        geometry = stations['geometry'].take(pc.index_in(table['station_id'], value_set=stations['station_id']))
+        table = table.append_column(stations.schema.field('geometry'), geometry)
+        return gpd.GeoDataFrame.from_arrow(table.select(columns)).set_crs(epsg=4326, allow_override=True)
+
+    @staticmethod
+    def _curated_column_order(names):
+        """
+        Column order of the clean daily files: partition columns after station_id and geometry before Hexagon_ID
+        """
+        names = [name for name in names if name not in ('year', 'month')]
+        names[1:1] = ['year', 'month']
+        names.insert(names.index('Hexagon_ID'), 'geometry')
+        return names
+
     def query_states(self):
         return gpd.read_parquet(self.datalake_root / self.paths["states_clean"])
 
-    def query_fire_perimeter(self, pyarrow_query=None, columns=None):
+    def query_fire_perimeter(self, pyarrow_query=None, columns=None, bbox=None):
+        """
+        Reads the clean fire perimeters, see _query_geoparquet
+        """
+        return self._query_geoparquet(self.paths["fire_perimeter_cleaned"], pyarrow_query, columns, bbox)
+
+    def query_fire_point(self, pyarrow_query=None, columns=None, bbox=None):
+        """
+        Reads the clean fire occurrence points, see _query_geoparquet
+        """
+        return self._query_geoparquet(self.paths["fire_point_clean"], pyarrow_query, columns, bbox)
+
+    def iter_fire_perimeter(self, pyarrow_query=None, columns=None, bbox=None, batch_size=64 * 1024):
+        """
+        Streams the clean fire perimeters as GeoDataFrames of at most batch_size rows, see _query_geoparquet
+        """
+        return self._iter_geoparquet(self.paths["fire_perimeter_cleaned"], pyarrow_query, columns, bbox, batch_size)
+
+    def iter_fire_point(self, pyarrow_query=None, columns=None, bbox=None, batch_size=64 * 1024):
+        """
+        Streams the clean fire occurrence points as GeoDataFrames of at most batch_size rows, see _query_geoparquet
+        """
+        return self._iter_geoparquet(self.paths["fire_point_clean"], pyarrow_query, columns, bbox, batch_size)
+
+    def _query_geoparquet(self, relative_path, pyarrow_query=None, columns=None, bbox=None):
+        """
+        Reads a GeoParquet file with the filter pushed down to its row groups, only the requested columns and the
+        row groups whose statistics can match are decoded.
+        :param pyarrow_query: pyarrow compute expression
+        :param columns: columns to read, must contain 'geometry'
+        :param bbox: (minx, miny, maxx, maxy) in EPSG:4326, keeps rows whose bounding box intersects it
+        """
         if columns and 'geometry' not in columns:
-            return ValueError("Columns list is provided but does not contain 'geometry'!")
-        elif pyarrow_query:
-            table = pq.read_table(self.datalake_root / self.paths["fire_perimeter_cleaned"], columns=columns).filter(
-                pyarrow_query)
-            return gpd.GeoDataFrame.from_arrow(table).to_crs(epsg=4326)
-        else:
-            table = pq.read_table(self.datalake_root / self.paths["fire_perimeter_cleaned"], columns=columns)
-            return gpd.GeoDataFrame.from_arrow(table).to_crs(epsg=4326)
+            raise ValueError("Columns list is provided but does not contain 'geometry'!")
+        dataset, read_columns, expression, bbox = self._geoparquet_scan(relative_path, pyarrow_query, columns, bbox)
+        return self._to_geodataframe(dataset.to_table(columns=read_columns, filter=expression), bbox)
 
-    def query_fire_point(self, pyarrow_query=None, columns=None):
+    def _iter_geoparquet(self, relative_path, pyarrow_query=None, columns=None, bbox=None, batch_size=64 * 1024):
         if columns and 'geometry' not in columns:
-            return ValueError("Columns list is provided but does not contain 'geometry'!")
-        elif pyarrow_query:
-            table = pq.read_table(self.datalake_root / self.paths["fire_point_clean"], columns=columns).filter(
-                pyarrow_query)
-            return gpd.GeoDataFrame.from_arrow(table).to_crs(epsg=4326)
-        else:
-            table = pq.read_table(self.datalake_root / self.paths["fire_point_clean"], columns=columns)
-            return gpd.GeoDataFrame.from_arrow(table).to_crs(epsg=4326)
+            raise ValueError("Columns list is provided but does not contain 'geometry'!")
+        dataset, read_columns, expression, bbox = self._geoparquet_scan(relative_path, pyarrow_query, columns, bbox)
+        for batch in dataset.to_batches(columns=read_columns, filter=expression, batch_size=batch_size):
+            gdf = self._to_geodataframe(pa.Table.from_batches([batch]), bbox)
+            if len(gdf):
+                yield gdf
+
+    def _geoparquet_scan(self, relative_path, pyarrow_query, columns, bbox):
+        """
+        Dataset, columns and filter of a GeoParquet scan. A bbox becomes a filter on the GeoParquet bbox covering
+        column when the file has one, so it is pushed down like any other predicate.
+        :return: dataset, columns, filter and the bbox still to be applied to the decoded geometries, if any
+        """
+        dataset = ds.dataset(self.datalake_root / relative_path, format='parquet')
+        names = dataset.schema.names
+        read_columns = columns or [name for name in names if name != 'bbox']
+        expression = pyarrow_query
+        if bbox is not None and 'bbox' in names and self._geoparquet_is_4326(dataset.schema):
+            minx, miny, maxx, maxy = bbox
+            covering = ((pc.field('bbox', 'xmin') <= maxx) & (pc.field('bbox', 'xmax') >= minx) &
+                        (pc.field('bbox', 'ymin') <= maxy) & (pc.field('bbox', 'ymax') >= miny))
+            expression = covering if expression is None else expression & covering
+            bbox = None
+        return dataset, list(read_columns), expression, bbox
+
+    @staticmethod
+    def _geoparquet_is_4326(schema) -> bool:
+        """
+        Whether the primary geometry column of a GeoParquet schema is stored in EPSG:4326, the default when no crs
+        is recorded
+        """
+        geo = json.loads((schema.metadata or {}).get(b'geo', b'{}'))
+        column = geo.get('columns', {}).get(geo.get('primary_column'), {})
+        return column.get('crs') is None or CRS.from_user_input(column['crs']).equals('EPSG:4326')
+
+    @staticmethod
+    def _to_geodataframe(table, bbox=None):
+        """
+        GeoDataFrame in EPSG:4326, only reprojected when the file is stored in another CRS
+        :param bbox: filters on the decoded geometries, for files without a bbox covering column
+        """
+        gdf = gpd.GeoDataFrame.from_arrow(table)
+        if gdf.crs is not None and not gdf.crs.equals('EPSG:4326'):
+            gdf = gdf.to_crs(epsg=4326)
+        if bbox is not None:
+            # No covering column to push the bbox down to, filter on the decoded geometries instead
+            bounds = gdf.geometry.bounds
+            minx, miny, maxx, maxy = bbox
+            gdf = gdf[(bounds['minx'] <= maxx) & (bounds['maxx'] >= minx) &
+                      (bounds['miny'] <= maxy) & (bounds['maxy'] >= miny)]
+        return gdf
+
+    def query_features(self, pyarrow_query=None, columns=None) -> pd.DataFrame:
+        """
+        Reads the hexagon x day feature table built by process_features
+        """
+        dataset = ds.dataset(self.datalake_root / self.paths["features"], format='parquet',
+                             partitioning=self.curated_partitioning)
+        columns = columns or ['Hexagon_ID', 'year', 'month', 'day', *feature_columns,
+                              *[f'{column}_avg' for column in feature_columns], 'fire_occurred', 'date']
+        return dataset.to_table(columns=columns, filter=pyarrow_query).to_pandas(date_as_object=False)
 
     def query_stations(self) -> gpd.GeoDataFrame:
         stations = pd.read_parquet(self.datalake_root / self.paths["ghcnd_clean_stations"])
@@ -91,22 +271,462 @@ class Datalake:
         result = pd.concat([us_stations, ca_stations, mx_stations])
 
         # Encode as shapely point object
-        result["geometry"] = result.apply(lambda row: Point(row["longitude"], row["latitude"]), axis=1)
+        result["geometry"] = gpd.points_from_xy(result["longitude"], result["latitude"])
+
+        # Each station's cell is computed once here and joined onto the daily rows by station_id
+        result["Hexagon_ID"] = self.assign_hexes(result["latitude"], result["longitude"])
 
         return gpd.GeoDataFrame(result, geometry="geometry", crs="EPSG:4326")
 
-    def process_ghcnd_stations(self):
+    def process_ghcnd_stations(self, force=False, dry_run=False):
+        artifact = self.paths["ghcnd_clean_stations"]
+        if not self._needs_build(artifact, [self.paths["ghcnd_raw_stations"]], force, dry_run):
+            return
         print('CLEANING GHCND STATIONS')
         self.clean_stations_file(self.datalake_root / self.paths["ghcnd_raw_stations"],
                                  self.datalake_root / self.paths["ghcnd_clean_stations"])
+        self.manifest.record(artifact, [self.paths["ghcnd_raw_stations"]])
 
-    def process_ghcnd_daily(self):
-        for year in range(self.years[0], self.years[1] + 1):
-            print(f'CLEANING DAILY: {year}')
-            self.clean_daily_file(self.datalake_root / self.paths["ghcnd_raw_daily"] / f'{year}.csv.gz',
-                                  self.datalake_root / self.paths["ghcnd_clean_daily"] / f'{year}.parquet')
+    def process_ghcnd_daily(self, stream=False, workers=None, force=False, dry_run=False):
+        """
+        Cleans every year of daily data whose raw file, the stations table or the code changed since its last build.
+        The stations table is loaded once and shared with every year.
+        A year that fails is reported and skipped, the other years are still cleaned.
+        :param stream: use stream_daily_file so peak memory is bounded by the batch size instead of the file size
+        :param workers: number of processes, years are cleaned in parallel when more than 1
+        :param force: rebuild every year even if it is up to date
+        :param dry_run: only list the years that would be rebuilt
+        :return: {year: {'seconds', 'max_rss_mb'}} for every cleaned year, failed years hold {'error'}
+        """
+        years = [year for year in range(self.years[0], self.years[1] + 1)
+                 if self._needs_build(self._daily_artifact(year), self._daily_sources(year), force, dry_run)]
+        results = {}
+        if not years:
+            return results
+
+        stations = self.query_stations()
+        if not workers or workers <= 1:
+            _init_daily_worker(stations)
+            for year in years:
+                print(f'CLEANING DAILY: {year}')
+                try:
+                    results[year] = _clean_daily_year(self, year, stream)
+                except Exception as e:
+                    results[year] = {'error': repr(e)}
+                self._report_daily_year(year, results[year])
+            return results
+
+        # Every year gets a fresh process so its peak memory is its own, not the largest year its worker cleaned before
+        broken = []
+        with self._daily_pool(workers, stations) as pool:
+            futures = {pool.submit(_clean_daily_year, self, year, stream): year for year in years}
+            for future in as_completed(futures):
+                year = futures[future]
+                try:
+                    results[year] = future.result()
+                except BrokenProcessPool:
+                    # A worker that died (e.g. OOM killed) fails every unfinished year, they are retried below
+                    broken.append(year)
+                    continue
+                except Exception as e:
+                    results[year] = {'error': repr(e)}
+                self._report_daily_year(year, results[year])
+
+        # Each year is retried alone, so a year that kills its worker again only fails itself
+        for year in sorted(broken):
+            print(f'RETRYING DAILY: {year}')
+            with self._daily_pool(1, stations) as pool:
+                try:
+                    results[year] = pool.submit(_clean_daily_year, self, year, stream).result()
+                except Exception as e:
+                    results[year] = {'error': repr(e)}
+            self._report_daily_year(year, results[year])
+        return dict(sorted(results.items()))
+
+    @staticmethod
+    def _daily_pool(workers, stations) -> ProcessPoolExecutor:
+        # max_tasks_per_child cannot be used with the fork start method
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   max_tasks_per_child=1, initializer=_init_daily_worker, initargs=(stations,))
+
+    def _daily_artifact(self, year):
+        return str(Path(self.paths["ghcnd_clean_daily"]) / f'{year}.parquet')
+
+    def _daily_sources(self, year):
+        return [str(Path(self.paths["ghcnd_raw_daily"]) / f'{year}.csv.gz'), self.paths["ghcnd_clean_stations"]]
+
+    def _needs_build(self, artifact, sources, force=False, dry_run=False):
+        """
+        Checks the build manifest and prints whether an artifact is up to date or would be rebuilt
+        :return: True when the caller should build the artifact
+        """
+        if not force and self.manifest.is_up_to_date(artifact, sources):
+            print(f'UP TO DATE: {artifact}')
+            return False
+        if dry_run:
+            print(f'WOULD REBUILD: {artifact}')
+            return False
+        return True
+
+    def _report_daily_year(self, year, result):
+        if 'error' in result:
+            print(f'FAILED DAILY: {year} {result["error"]}')
+        else:
+            self.manifest.record(self._daily_artifact(year), self._daily_sources(year))
+            print(f'CLEANED DAILY: {year} in {result["seconds"]:.1f}s, peak process memory {result["max_rss_mb"]:.0f} MB')
+
+    def process_ghcnd_curated(self, force=False, dry_run=False):
+        """
+        Rewrites the clean daily files into the curated layout: partitioned by year and month, sorted by Hexagon_ID
+        and date, with row group and page statistics, and without the per row geometry, which is kept once per
+        station in the curated stations table instead.
+        :param force: rebuild every year even if it is up to date
+        :param dry_run: only list the years that would be rebuilt
+        """
+        years = [year for year in range(self.years[0], self.years[1] + 1)
+                 if (self.datalake_root / self._daily_artifact(year)).exists()]
+        for year in years:
+            artifact = str(Path(self.paths["ghcnd_curated_daily"]) / f'year={year}')
+            if not self._needs_build(artifact, [self._daily_artifact(year)], force, dry_run):
+                continue
+            print(f'CURATING DAILY: {year}')
+            self.curate_daily_file(self.datalake_root / self._daily_artifact(year), self.datalake_root / artifact)
+            self.manifest.record(artifact, [self._daily_artifact(year)])
+
+        sources = [self._daily_artifact(year) for year in years]
+        if not sources or not self._needs_build(self.paths["ghcnd_curated_stations"], sources, force, dry_run):
+            return
+        print(f'CURATING STATIONS: {len(sources)} years')
+        # Later years win if a station moved
+        stations = self._curated_stations(pa.concat_tables(
+            [pq.read_table(self.datalake_root / source, columns=['station_id', 'geometry']) for source in sources[::-1]]))
+        stations_path = self.datalake_root / self.paths["ghcnd_curated_stations"]
+        tmp_path = stations_path.with_name(stations_path.name + '.tmp')
+        gpd.GeoDataFrame.from_arrow(stations).to_parquet(tmp_path)
+        os.replace(tmp_path, stations_path)
+        self.manifest.record(self.paths["ghcnd_curated_stations"], sources)
+
+    def curate_daily_file(self, clean_path, year_path):
+        """
+        Writes one clean daily file as year_path/month=M/part-0.parquet.
+        The year is written to a temporary directory first and swapped in once every month is written.
+        :param clean_path: clean daily parquet file of a single year
+        :param year_path: partition directory of that year, e.g. curated/ghcnd/daily/year=2020
+        """
+        year_path = Path(year_path)
+        tmp_path = year_path.with_name(year_path.name + '.tmp')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+        table = compact_ghcnd(pq.read_table(clean_path).drop_columns(['geometry', 'year']))
+        table = table.replace_schema_metadata(None)
+        # Arrow cannot sort by a dictionary column, sort by the decoded station ids
+        keys = table.select(['month', 'Hexagon_ID', 'day']).append_column(
+            'station_id', table['station_id'].cast(pa.string()))
+        table = table.take(pc.sort_indices(keys, sort_keys=[('month', 'ascending'), ('Hexagon_ID', 'ascending'),
+                                                             ('day', 'ascending'), ('station_id', 'ascending')]))
+        table = table.combine_chunks()
+        months = table['month'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if len(months) else []
+        stops = np.r_[starts[1:], len(months)] if len(months) else []
+        for start, stop in zip(starts, stops):
+            month_table = table.slice(start, stop - start).drop_columns(['month'])
+            sorting = [pq.SortingColumn(month_table.schema.get_field_index(name)) for name in ('Hexagon_ID', 'day')]
+            month_path = tmp_path / f'month={months[start]}'
+            month_path.mkdir(parents=True)
+            pq.write_table(month_table, month_path / 'part-0.parquet', row_group_size=self.curated_row_group_size,
+                           compression='zstd', write_statistics=True, write_page_index=True,
+                           sorting_columns=sorting)
+
+        shutil.rmtree(year_path, ignore_errors=True)
+        year_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, year_path)
+
+    @staticmethod
+    def _curated_stations(table):
+        """
+        One (station_id, geometry) row per station, sorted by station_id. Each id appears once so it is not
+        dictionary encoded like in the daily rows.
+        """
+        _, first = np.unique(table['station_id'].to_numpy(zero_copy_only=False), return_index=True)
+        table = table.select(['station_id', 'geometry']).take(first)
+        return table.set_column(0, 'station_id', table['station_id'].cast(pa.string()))
+
+    def process_features(self, start=None, end=None, force=False, dry_run=False):
+        """
+        Builds the hexagon x day feature table the model is trained on, one file per day under
+        curated/features/year=Y/month=M/.
+        For every hexagon and day it stores the mean of each element over the hexagon's stations, missing values
+        imputed from the neighbouring cells, their 3-day trailing averages (at least 2 days with a value) and
+        whether a fire was discovered. Days are computed a month at a time. Only the days to rebuild and the two days
+        before the first of them are read, days of the previous month are carried over from their feature files, so
+        adding a day computes that day and the two days its average needs.
+        :param start: first day, defaults to the first day of self.years
+        :param end: last day, defaults to the last day of self.years
+        :param force: rebuild every day even if it is up to date
+        :param dry_run: only list the days that would be rebuilt
+        """
+        start = pd.Timestamp(start or f'{self.years[0]}-01-01')
+        end = pd.Timestamp(end or f'{self.years[1]}-12-31')
+        grid = np.array(sorted(_hex_grid(self.hex_resolution, *self.hex_center, self.hex_ring_size)))
+        # H3 strings of one resolution sort like their integers, so positions in both arrays agree
+        cells = hexagon_ints(grid).to_numpy()
+        neighbors = hex_neighbors(grid, self.feature_neighbor_rings) if self.feature_neighbor_rings else None
+
+        for month_start in pd.date_range(start.replace(day=1), end, freq='MS'):
+            month_days = pd.date_range(month_start, month_start + pd.offsets.MonthEnd(0))
+            days = [day for day in month_days if start <= day <= end and
+                    self._needs_build(self._feature_artifact(day), self._feature_sources(day), force, dry_run)]
+            if not days:
+                continue
+            print(f'BUILDING FEATURES: {month_start:%Y-%m}')
+            # Consecutive days from two days before the first day to build, the ones before the month are carried
+            span = pd.date_range(days[0] - pd.Timedelta(days=2), days[-1])
+            read = [day.day for day in span if day >= month_start]
+            daily, reported = self._hex_daily_means(month_start.year, month_start.month, read, cells, neighbors)
+            carry = [self._carried_daily_means(day, cells, neighbors) for day in span if day < month_start]
+            averages = rolling_mean(np.concatenate([np.stack(carry), daily]) if carry else daily)[len(carry):]
+            fires = self._hex_fire_days(month_start.year, month_start.month, read, cells)
+
+            for day in days:
+                i = read.index(day.day)
+                path = self.datalake_root / self._feature_artifact(day)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + '.tmp')
+                rows = reported[i] | ~np.isnan(daily[i]).all(axis=1)
+                pq.write_table(self._feature_table(day, cells[rows], daily[i, rows], averages[i, rows], fires[i, rows]),
+                               tmp_path)
+                os.replace(tmp_path, path)
+                self.manifest.record(self._feature_artifact(day), self._feature_sources(day))
+
+    def _feature_artifact(self, day):
+        return str(Path(self.paths["features"]) / f'year={day.year}' / f'month={day.month}' / f'{day:%Y-%m-%d}.parquet')
+
+    def _feature_sources(self, day):
+        """
+        GHCN-D files holding the day and the two days before it, and the fire points
+        """
+        sources = []
+        for source_day in pd.date_range(day - pd.Timedelta(days=2), day):
+            source = self._ghcnd_month_source(source_day.year, source_day.month)
+            if source not in sources and (self.datalake_root / source).exists():
+                sources.append(source)
+        if (self.datalake_root / self.paths["fire_point_clean"]).exists():
+            sources.append(self.paths["fire_point_clean"])
+        return sources
+
+    def _ghcnd_month_source(self, year, month):
+        """
+        File holding a month of GHCN-D daily data, in the curated layout when it has been built
+        """
+        if (self.datalake_root / self.paths["ghcnd_curated_daily"]).exists():
+            return str(Path(self.paths["ghcnd_curated_daily"]) / f'year={year}' / f'month={month}' / 'part-0.parquet')
+        return self._daily_artifact(year)
+
+    def _ghcnd_dataset(self):
+        curated_path = self.datalake_root / self.paths["ghcnd_curated_daily"]
+        if curated_path.exists():
+            return ds.dataset(curated_path, format='parquet', partitioning=self.curated_partitioning)
+        return ds.dataset(self.datalake_root / self.paths["ghcnd_clean_daily"])
+
+    def _hex_daily_means(self, year, month, days, cells, neighbors):
+        """
+        Station mean of every element per hexagon and day as a (days, cells, elements) array,
+        NaN where a hexagon has no value, imputed from its neighbours when neighbors is given
+        :param days: sorted days of the month to read
+        :return: the means and a (days, cells) array of the hexagons with at least one station reporting that day
+        """
+        query = (pc.field('year') == year) & (pc.field('month') == month) & pc.field('day').isin(days)
+        df = self._ghcnd_dataset().to_table(columns=['Hexagon_ID', 'day', *feature_columns], filter=query).to_pandas()
+        df = df[df['Hexagon_ID'].isin(cells)]
+        means = df.groupby(['day', 'Hexagon_ID'])[feature_columns].mean()
+
+        values = np.full((len(days), len(cells), len(feature_columns)), np.nan)
+        day_index = np.searchsorted(days, means.index.get_level_values('day').to_numpy())
+        cell_index = np.searchsorted(cells, means.index.get_level_values('Hexagon_ID').to_numpy())
+        values[day_index, cell_index] = means.to_numpy()
+        reported = np.zeros((len(days), len(cells)), dtype=bool)
+        reported[day_index, cell_index] = True
+        return values if neighbors is None else impute_from_neighbors(values, neighbors), reported
+
+    def _carried_daily_means(self, day, cells, neighbors):
+        """
+        Daily means of a day before the month being built, read from its feature file when it exists
+        """
+        path = self.datalake_root / self._feature_artifact(day)
+        if not path.exists():
+            return self._hex_daily_means(day.year, day.month, [day.day], cells, neighbors)[0][0]
+        table = pq.read_table(path, columns=['Hexagon_ID', *feature_columns])
+        values = np.full((len(cells), len(feature_columns)), np.nan)
+        cell_index = np.searchsorted(cells, hexagon_ints(table['Hexagon_ID']).to_numpy())
+        values[cell_index] = np.column_stack([table[column].to_numpy() for column in feature_columns])
+        return values
 
-    def process_states(self):
+    def _hex_fire_days(self, year, month, days, cells):
+        """
+        Whether a fire was discovered in each hexagon on each day as a (days, cells) bool array
+        :param days: sorted days of the month to read
+        """
+        fires = np.zeros((len(days), len(cells)), dtype=bool)
+        if not (self.datalake_root / self.paths["fire_point_clean"]).exists():
+            return fires
+        points = self.query_fire_point((pc.field('year') == year) & (pc.field('month') == month) &
+                                       pc.field('day').isin(days), columns=['day', 'geometry'])
+        points = points[points.geometry.notna()]
+        hexes = self.assign_hexes(points.geometry.y.to_numpy(), points.geometry.x.to_numpy())
+        inside = pd.notna(hexes)
+        fires[np.searchsorted(days, points['day'].to_numpy()[inside].astype(int)),
+              np.searchsorted(cells, hexagon_ints(hexes[inside]).to_numpy())] = True
+        return fires
+
+    @staticmethod
+    def _feature_table(day, cells, daily, averages, fires) -> pa.Table:
+        """
+        Feature rows of one day, one per hexagon with a reporting station or an imputed value
+        """
+        columns = {'Hexagon_ID': hexagon_ints(cells), 'day': pa.array(np.full(len(cells), day.day, dtype=np.int8))}
+        columns.update({column: daily[:, i].astype(np.float32) for i, column in enumerate(feature_columns)})
+        columns.update({f'{column}_avg': averages[:, i].astype(np.float32) for i, column in enumerate(feature_columns)})
+        columns['fire_occurred'] = fires.astype(np.int8)
+        columns['date'] = pa.array(np.full(len(cells), day.to_datetime64().astype('datetime64[D]')))
+        return pa.table(columns)
+
+    def process_model_output(self, model_path, output_root, start=None, end=None, n_jobs=-1, force=False,
+                             dry_run=False):
+        """
+        Scores the feature table with the random forest and writes one Model_Output_YYYY-MM-DD.parquet per day to
+        output_root, the files the dashboard reads. Outputs hold the Hexagon_ID, date and values only, the polygons
+        are in the static table written by process_hex_geometry.
+        The model is loaded once and scoring_batch_days days are scored per call using n_jobs cores. Days whose
+        feature file and model did not change since they were scored are skipped.
+        :param model_path: joblib file of the fitted model, see ModelScorer
+        :param output_root: directory the daily outputs are written to
+        :param start: first day, defaults to the first day of self.years
+        :param end: last day, defaults to the last day of self.years
+        :param n_jobs: cores used for scoring, -1 uses all of them
+        :param force: rescore every day even if it is up to date
+        :param dry_run: only list the days that would be scored
+        """
+        start = pd.Timestamp(start or f'{self.years[0]}-01-01')
+        end = pd.Timestamp(end or f'{self.years[1]}-12-31')
+        # Outputs live outside the datalake, absolute paths keep their manifest entries independent of the cwd
+        model_path = Path(model_path).resolve()
+        output_root = Path(output_root).resolve()
+
+        days = [day for day in pd.date_range(start, end) if (self.datalake_root / self._feature_artifact(day)).exists()
+                and self._needs_build(self._model_output_artifact(output_root, day),
+                                      [self._feature_artifact(day), str(model_path)], force, dry_run)]
+        if not days:
+            return
+        output_root.mkdir(parents=True, exist_ok=True)
+        cells = np.array(sorted(_hex_grid(self.hex_resolution, *self.hex_center, self.hex_ring_size)))
+        scorer = ModelScorer(model_path, cells, n_jobs)
+        elevation = self._hex_elevation()
+
+        for i in range(0, len(days), self.scoring_batch_days):
+            batch = days[i:i + self.scoring_batch_days]
+            begin = time.perf_counter()
+            features = ds.dataset([str(self.datalake_root / self._feature_artifact(day)) for day in batch],
+                                  format='parquet').to_table().to_pandas(date_as_object=False)
+            features = features.sort_values(['date', 'Hexagon_ID'], kind='stable', ignore_index=True)
+            starts = day_starts(features['date'])
+            table = self._model_output_table(features, scorer.predict(features, starts), elevation, starts)
+
+            for row, stop in zip(starts, np.r_[starts[1:], len(features)]):
+                day = features['date'].iloc[row]
+                artifact = self._model_output_artifact(output_root, day)
+                tmp_path = Path(artifact).with_name(Path(artifact).name + '.tmp')
+                pq.write_table(table.slice(row, stop - row), tmp_path)
+                os.replace(tmp_path, artifact)
+                self.manifest.record(artifact, [self._feature_artifact(day), str(model_path)])
+            print(f'SCORED: {batch[0]:%Y-%m-%d} to {batch[-1]:%Y-%m-%d}, {len(features):,} rows in '
+                  f'{time.perf_counter() - begin:.1f}s')
+
+    @staticmethod
+    def _model_output_artifact(output_root, day):
+        return str(Path(output_root) / f'Model_Output_{day:%Y-%m-%d}.parquet')
+
+    def _hex_elevation(self) -> pd.Series:
+        """
+        Mean elevation of the stations in each hexagon
+        """
+        stations = self.query_stations()
+        elevation = stations.groupby('Hexagon_ID')['elevation'].mean()
+        elevation.index = hexagon_ints(elevation.index).to_numpy()
+        return elevation
+
+    @staticmethod
+    def _model_output_table(features, probability, elevation, starts) -> pa.Table:
+        """
+        Model output rows of a batch of days sorted by date, with every value also min/max normalized per day in
+        the 'Normalized <column>' columns the dashboard colors the map by
+        """
+        df = pd.DataFrame({'Hexagon_ID': features['Hexagon_ID']})
+        for column, name in output_columns.items():
+            df[name] = features[column]
+        df['Fire Occurred?'] = features['fire_occurred']
+        df['date'] = features['date']
+        df['Average Elevation'] = features['Hexagon_ID'].map(elevation).to_numpy(dtype=np.float64)
+        df['Predicted Fire Probability'] = probability
+
+        df['Normalized Predicted Fire Probability'] = normalize_probability(probability, starts)
+        for name in [*output_columns.values(), 'Average Elevation']:
+            df[f'Normalized {name}'] = min_max_by_day(df[name].to_numpy(dtype=np.float64), starts)
+        return compact_model_output(pa.Table.from_pandas(df, preserve_index=False))
+
+    def process_rollups(self, output_root, granularities=granularities, force=False, dry_run=False):
+        """
+        Aggregates the daily model outputs in output_root per hexagon and week, month or season: mean, max and 90th
+        percentile of the fire probability and the weather values, each with a normalized copy for the map.
+        Every period is a small output_root/rollups/<granularity>/Rollup_YYYY-MM-DD.parquet partition named after its
+        first day, only periods whose daily outputs changed are aggregated again.
+        :param output_root: directory holding the Model_Output_YYYY-MM-DD.parquet files
+        :param granularities: periods to aggregate to, see rollup.granularities
+        :param force: rebuild every period even if it is up to date
+        :param dry_run: only list the periods that would be rebuilt
+        """
+        output_root = Path(output_root).resolve()
+        daily = {pd.Timestamp(path.stem.removeprefix('Model_Output_')): path
+                 for path in sorted(output_root.glob('Model_Output_*.parquet'))}
+
+        for granularity in granularities:
+            (output_root / 'rollups' / granularity).mkdir(parents=True, exist_ok=True)
+            for start in sorted({period_start(day, granularity) for day in daily}):
+                days = [day for day in period_days(start, granularity) if day in daily]
+                artifact = self._rollup_artifact(output_root, granularity, start)
+                sources = [str(daily[day]) for day in days]
+                if not self._needs_build(artifact, sources, force, dry_run):
+                    continue
+                tables = [compact_model_output(pq.read_table(daily[day], columns=['Hexagon_ID', *rollup_values]))
+                          for day in days]
+                df = pa.concat_tables(tables).to_pandas()
+                tmp_path = Path(artifact).with_name(Path(artifact).name + '.tmp')
+                pq.write_table(rollup_table(df, start), tmp_path)
+                os.replace(tmp_path, artifact)
+                self.manifest.record(artifact, sources)
+                print(f'ROLLED UP: {granularity} {start:%Y-%m-%d} from {len(days)} days')
+
+    @staticmethod
+    def _rollup_artifact(output_root, granularity, start):
+        return str(Path(output_root) / 'rollups' / granularity / f'Rollup_{start:%Y-%m-%d}.parquet')
+
+    def process_hex_geometry(self, force=False, dry_run=False):
+        """
+        Writes the polygon of every cell of the hexagon grid once, the model outputs only carry the Hexagon_ID
+        """
+        if not self._needs_build(self.paths["hex_geometry"], [], force, dry_run):
+            return
+        cells = sorted(_hex_grid(self.hex_resolution, *self.hex_center, self.hex_ring_size))
+        # Polygons keep the (lat, lng) order of the geometry the model outputs used to repeat
+        geometry = [Polygon(h3.cell_to_boundary(cell)) for cell in cells]
+        hexagons = gpd.GeoDataFrame({'Hexagon_ID': cells}, geometry=geometry, crs="EPSG:4326")
+        path = self.datalake_root / self.paths["hex_geometry"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        hexagons.to_parquet(path)
+        self.manifest.record(self.paths["hex_geometry"], [])
+
+    def process_states(self, force=False, dry_run=False):
+        if not self._needs_build(self.paths["states_clean"], [self.paths["states_raw"]], force, dry_run):
+            return
         raw_path = self.datalake_root / self.paths["states_raw"]
         clean_path = self.datalake_root / self.paths["states_clean"]
         states = None
@@ -129,60 +749,134 @@ class Datalake:
         ]
         states = states[['name', 'code', 'geometry']]
         states.to_parquet(clean_path)
+        self.manifest.record(self.paths["states_clean"], [self.paths["states_raw"]])
 
-    def process_fire_point(self):
+    def process_fire_point(self, force=False, dry_run=False):
+        sources = [self.paths["fire_point_raw"], self.paths["states_clean"]]
+        if not self._needs_build(self.paths["fire_point_clean"], sources, force, dry_run):
+            return
         gdf = gpd.read_file(self.datalake_root / self.paths["fire_point_raw"])
-        # gdf = self.drop_not_conus(gdf) # TODO THIS TAKES YEARS
+        # Cleaning first repairs points that are missing a geometry but have coordinates
         gdf = self._clean_fire_point(gdf)
-        gdf.to_parquet(self.datalake_root / self.paths["fire_point_clean"])
-
-    def process_fire_perimeter(self):
-        gdf = self._repair_geojson(self.datalake_root / self.paths["fire_perimeter_raw"])
-        gdf = self.drop_not_conus(gdf)
-        gdf = self._clean_fire_perimeter(gdf)
-        gdf.to_parquet(self.datalake_root / self.paths["fire_perimeter_cleaned"])
-
-    def drop_not_conus(self, gdf):
-        states = self.query_states()
-        union = states.geometry.union_all()
-        gdf = gdf[gdf.geometry.within(union)]
+        gdf = self.drop_not_conus(gdf, code_column='state')
+        self._write_geoparquet(gdf, self.datalake_root / self.paths["fire_point_clean"])
+        self.manifest.record(self.paths["fire_point_clean"], sources)
+
+    def process_fire_perimeter(self, force=False, dry_run=False):
+        """
+        Repairs, filters and cleans the perimeters one batch at a time and appends each batch to the clean file,
+        so peak memory depends on the batch size and not on the size of the GeoJSON file
+        """
+        sources = [self.paths["fire_perimeter_raw"], self.paths["states_clean"]]
+        if not self._needs_build(self.paths["fire_perimeter_cleaned"], sources, force, dry_run):
+            return
+        conus = ConusIndex(self.query_states())
+        batches = (self._clean_fire_perimeter(self.drop_not_conus(gdf, index=conus))
+                   for gdf in self._repair_geojson(self.datalake_root / self.paths["fire_perimeter_raw"]))
+        self._write_geoparquet_batches(batches, self.datalake_root / self.paths["fire_perimeter_cleaned"],
+                                       total_bounds=conus.total_bounds)
+        self.manifest.record(self.paths["fire_perimeter_cleaned"], sources)
+
+    def _write_geoparquet(self, gdf, path):
+        """
+        Writes a GeoParquet file with a bbox covering column and rows in Hilbert curve order, so nearby features
+        share row groups and a bbox query can skip the others using the covering column statistics
+        """
+        has_geometry = gdf.geometry.notna() & ~gdf.geometry.is_empty
+        order = np.full(len(gdf), np.iinfo(np.uint32).max, dtype=np.int64)
+        if has_geometry.any():
+            order[has_geometry.to_numpy()] = gdf[has_geometry].hilbert_distance().to_numpy()
+        gdf = gdf.iloc[np.argsort(order, kind='stable')]
+        gdf.to_parquet(path, write_covering_bbox=True, row_group_size=self.geoparquet_row_group_size)
+
+    def _write_geoparquet_batches(self, batches, path, total_bounds):
+        """
+        Writes GeoDataFrame batches to one GeoParquet file with a bbox covering column, one row group per batch.
+        Each batch is put in Hilbert curve order over the same total_bounds so features inside a row group are close.
+        The file is written next to path and renamed once complete.
+        """
+        tmp_path = path.with_name(path.name + '.tmp')
+        writer = None
+        try:
+            for gdf in batches:
+                if gdf.empty:
+                    continue
+                gdf = gdf.iloc[np.argsort(gdf.hilbert_distance(total_bounds=total_bounds).to_numpy(), kind='stable')]
+                table = geoparquet_table(gdf, covering_bbox=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, self._batch_schema(table.schema))
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError(f"No features left to write to {path}")
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _batch_schema(schema):
+        """
+        File schema taken from the first batch. Its geo metadata only describes that batch, so the bbox and
+        geometry types are dropped, and columns that were all null in it are typed as strings.
+        """
+        geo = json.loads(schema.metadata[b'geo'])
+        for column in geo['columns'].values():
+            column.pop('bbox', None)
+            column['geometry_types'] = []
+        fields = [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema]
+        return pa.schema(fields, metadata={**schema.metadata, b'geo': json.dumps(geo).encode()})
+
+    def drop_not_conus(self, gdf, code_column=None, index=None):
+        """
+        Drops the rows that are not within the contiguous US, see ConusIndex
+        :param code_column: if given, the code of the state holding each row is stored in this column
+        :param index: ConusIndex to reuse across calls, built from query_states when not given
+        """
+        codes = (index or ConusIndex(self.query_states())).tag(gdf)
+        inside = codes.notna()
+        gdf = gdf[inside]
+        if code_column:
+            gdf = gdf.assign(**{code_column: codes[inside].astype('category')})
         return gdf
 
     def erase(self):
         pass
 
-    def download_ghcnd(self):
-        self._download_file(self.ghcnd_sources["readme"], self.datalake_root / self.paths["ghcnd_metadata"])
-        # download stations
-        self._download_file(self.ghcnd_sources['stations'], self.datalake_root / self.paths["ghcnd_raw_stations"])
+    def download_ghcnd(self, force=False, dry_run=False, workers=4):
+        """
+        Downloads the GHCN-D sources concurrently. Files whose remote ETag and size match the copy on disk are
+        skipped, interrupted downloads are resumed from their .part file.
+        :param force: download every file even if it is up to date
+        :param dry_run: only list the files that would be downloaded
+        :param workers: number of files downloaded at the same time
+        """
+        downloads = [(self.ghcnd_sources["readme"], self.paths["ghcnd_metadata"]),
+                     # download stations
+                     (self.ghcnd_sources['stations'], self.paths["ghcnd_raw_stations"])]
         # download daily
         for year in range(self.years[0], self.years[1] + 1):
             file_url = f'{self.ghcnd_sources["bucket"]}/csv.gz/by_year/{year}.csv.gz'
-            dest_path = self.datalake_root / self.paths['ghcnd_raw_daily'] / f'{year}.csv.gz'
-            self._download_file(file_url, dest_path)
+            downloads.append((file_url, str(Path(self.paths['ghcnd_raw_daily']) / f'{year}.csv.gz')))
 
-    @staticmethod
-    def _download_file(file_url, dest_path):
-        """
-        Downloads a file from a url to a filesystem path.
-        If file is less than 1GiB then direct download and save to disk.
-        If file is larger than 1GiB stream download to disk.
-        """
-        print(f'Downloading {file_url}')
-        response = requests.head(file_url)
-        file_size = int(response.headers.get('content-length', 0))
-        one_gib = 1 * 1024 * 1024 * 1024
+        downloader = Downloader(workers=workers)
+        jobs = []
+        artifacts = {}
+        for file_url, artifact in downloads:
+            jobs.append((file_url, self.datalake_root / artifact, self.manifest.get(artifact).get('remote')))
+            artifacts[file_url] = artifact
 
-        if file_size < one_gib:
-            response = requests.get(file_url)
-            with open(dest_path, 'wb') as file:
-                file.write(response.content)
-        else:
-            response = requests.get(file_url, stream=True)
-            with open(dest_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
-        pass
+        failed = []
+        for file_url, dest_path, result in downloader.sync_all(jobs, force=force, dry_run=dry_run):
+            if isinstance(result, Exception):
+                print(f'FAILED: {file_url}: {result}')
+                failed.append(file_url)
+                continue
+            status, remote = result
+            if status == 'downloaded':
+                self.manifest.record(artifacts[file_url], [], url=file_url, remote=remote)
+            else:
+                print(f'{status.upper()}: {artifacts[file_url]}')
+        return failed
 
     def _create_subdirectory(self, relative_path):
         """
@@ -197,23 +891,30 @@ class Datalake:
             print(f'{relative_path} folder already exists')
 
     @staticmethod
-    def _repair_geojson(path):
+    def _repair_geojson(path, batch_size=4096):
+        """
+        Streams a GeoJSON file as GeoDataFrames of at most batch_size features in EPSG:4326.
+        Invalid geometries are repaired with make_valid, geometries that cannot be read become empty polygons.
+        Only one batch is held in memory at a time.
+        """
         print("READING/REPAIRING GEOJSON ")
-        with open(path, 'r') as f:
-            data = json.load(f)
-        for feature in data['features']:
-            try:
-                geometry = shape(feature['geometry'])
-                if not geometry.is_valid:
-                    geometry = make_valid(geometry)
-                feature['geometry'] = mapping(geometry)
-            except Exception as e:
-                print(f"Error processing geometry: {e}")
-                feature['geometry'] = mapping(Polygon())  # Replace with an empty polygon
-        geojson_str = json.dumps(data)
-        geojson_file = StringIO(geojson_str)
-        gdf = gpd.read_file(geojson_file).to_crs(epsg=4326)
-        return gdf
+        with pyogrio.open_arrow(path, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+            geometry_name = meta['geometry_name'] or 'wkb_geometry'
+            for batch in reader:
+                geometries = shapely.from_wkb(batch.column(geometry_name).to_numpy(zero_copy_only=False),
+                                              on_invalid='ignore')
+                missing = shapely.is_missing(geometries)
+                if missing.any():
+                    print(f"Error processing geometry: {missing.sum()} features without a readable geometry")
+                    geometries[missing] = Polygon()  # Replace with an empty polygon
+                invalid = ~shapely.is_valid(geometries)
+                geometries[invalid] = shapely.make_valid(geometries[invalid])
+
+                attributes = batch.drop_columns([geometry_name]).to_pandas()
+                gdf = gpd.GeoDataFrame(attributes, geometry=geometries, crs=meta['crs'])
+                if gdf.crs is not None and not gdf.crs.equals('EPSG:4326'):
+                    gdf = gdf.to_crs(epsg=4326)
+                yield gdf
 
     @staticmethod
     def _clean_fire_perimeter(gdf):
@@ -234,7 +935,8 @@ class Datalake:
 
     @staticmethod
     def _clean_fire_point(gdf):
-        gdf.to_crs(epsg=4326)
+        if gdf.crs is not None and not gdf.crs.equals('EPSG:4326'):
+            gdf = gdf.to_crs(epsg=4326)
         # TODO DROP UNWANTED COLS
         drop = ['SHAPE', 'GLOBALID', 'REVDATE', 'COMPLEXNAME', 'SOFIRENUM', 'LOCALFIRENUM', 'SECURITYID', 'DATASOURCE',
                 'OWNERAGENCY', 'UNITIDOWNER', 'PROTECTIONAGENCY', 'UNITIDPROTECT', 'POINTTYPE', 'FIRERPTQC',
@@ -242,22 +944,49 @@ class Datalake:
                 'DBSOURCEDATE', 'ACCURACY', 'SHAPE', 'FIREOUTDATETIME', 'FIREYEAR']
         gdf = gdf.drop(columns=drop)
 
-        # TODO PROCESS DATES
+        # Discovery dates are datetimes, or strings like '2003/07/21 00:00:00+00' (ISO dates from newer GDAL) when
+        # some years are out of range for datetime64, then the parts are parsed as integers.
+        # Rows without a parsable date are dropped
         gdf = gdf.dropna(subset=['DISCOVERYDATETIME'])
-        dates = gdf['DISCOVERYDATETIME'].str.split(" ", expand=True)[0].str.split('/', expand=True)
-        dates.columns = ['year', 'month', 'day']
-        gdf = pd.concat([gdf, dates], axis=1)
-        gdf = gdf.drop(columns=['DISCOVERYDATETIME'])
-
-        # TODO REPAIR POINTS
-        gdf['geometry'] = gdf.apply(
-            lambda row: Point(row['LONGDD83'], row['LATDD83']) if pd.isnull(row['geometry']) and pd.notnull(
-                row['LATDD83']) and pd.notnull(row['LONGDD83']) else row['geometry'], axis=1)
+        discovered = gdf['DISCOVERYDATETIME']
+        if pd.api.types.is_datetime64_any_dtype(discovered):
+            dates = {'year': discovered.dt.year, 'month': discovered.dt.month, 'day': discovered.dt.day}
+            parsed = np.ones(len(gdf), dtype=bool)
+        else:
+            parts = pc.extract_regex(pa.array(discovered.astype(str).to_numpy(), type=pa.string()),
+                                     r'^(?P<year>\d{1,4})[/-](?P<month>\d{1,2})[/-](?P<day>\d{1,2})')
+            parsed = parts.is_valid().to_numpy(zero_copy_only=False)
+            dates = {name: parts.field(name).to_numpy(zero_copy_only=False) for name in ('year', 'month', 'day')}
+        gdf = gdf[parsed].drop(columns=['DISCOVERYDATETIME'])
+        gdf = gdf.assign(year=np.asarray(dates['year'])[parsed].astype(np.int16),
+                         month=np.asarray(dates['month'])[parsed].astype(np.int8),
+                         day=np.asarray(dates['day'])[parsed].astype(np.int8))
+
+        # Points without a geometry are rebuilt from their NAD83 coordinates when both are present
+        missing = (gdf.geometry.isna() & gdf['LATDD83'].notna() & gdf['LONGDD83'].notna()).to_numpy()
+        if missing.any():
+            geometry = gdf.geometry.copy()
+            geometry[missing] = gpd.points_from_xy(gdf['LONGDD83'].to_numpy()[missing],
+                                                   gdf['LATDD83'].to_numpy()[missing], crs=gdf.crs)
+            gdf = gdf.set_geometry(geometry)
         gdf = gdf.drop(columns=['LATDD83', 'LONGDD83'])
 
         # TODO RENAME COLUMN NAMES
 
-        return gdf
+        return Datalake._categorize(gdf)
+
+    @staticmethod
+    def _categorize(df, max_ratio=0.05):
+        """
+        Stores low cardinality string columns as pandas categoricals, they are written as parquet dictionaries
+        :param max_ratio: largest ratio of distinct values to rows for a column to be converted
+        """
+        for column in df.columns:
+            if column == df.geometry.name or pd.api.types.infer_dtype(df[column], skipna=True) != 'string':
+                continue
+            if df[column].nunique() <= max_ratio * len(df):
+                df[column] = df[column].astype('category')
+        return df
 
     @staticmethod
     def clean_stations_file(raw_path, clean_path):
@@ -293,7 +1022,7 @@ class Datalake:
 
     @staticmethod
     def drop_daily_columns(df):
-        df.drop(columns=['time', 'date', 'm_flag', 'q_flag', 's_flag'], inplace=True)
+        df.drop(columns=['time', 'date', 'm_flag', 'q_flag', 's_flag'], inplace=True, errors='ignore')
         return df
 
     def create_element_tables(self, df):
@@ -313,6 +1042,38 @@ class Datalake:
             left = pd.merge(left, right, on=['station_id', 'year', 'month', 'day'], how='outer')
         return left
 
+    def pivot_elements(self, df):
+        """
+        Long to wide transform of the daily observations in a single pass, same output as
+        join_element_tables(create_element_tables(df)) without filtering once per element and chaining outer merges.
+        Station-days are encoded as one integer key, factorized once, and every value is scattered into a
+        preallocated column per element. Rows come out sorted by station_id, year, month, day like the merge chain.
+        Assumes one observation per station, day and element, as in the GHCN-D files.
+        :param df: daily observations with station_id, year, month, day, element and value columns
+        """
+        df = df[df['element'].isin(self.ghcnd_elements)]
+
+        # station_id codes follow the sorted station ids, the date part keeps year, month, day ordering
+        station_codes, station_ids = pd.factorize(df['station_id'], sort=True)
+        dates = (df['year'].to_numpy(np.int64) * 10000 + df['month'].to_numpy(np.int64) * 100 +
+                 df['day'].to_numpy(np.int64))
+        keys, rows = np.unique(station_codes.astype(np.int64) * 100000000 + dates, return_inverse=True)
+
+        element_codes = pd.Categorical(df['element'].astype(str), categories=self.ghcnd_elements).codes
+        values = np.full((len(self.ghcnd_elements), len(keys)), np.nan, dtype=df['value'].dtype)
+        values[element_codes, rows] = df['value'].to_numpy()
+
+        dates = keys % 100000000
+        wide = pd.DataFrame({
+            'station_id': station_ids.to_numpy()[keys // 100000000],
+            'year': (dates // 10000).astype(df['year'].dtype),
+            'month': (dates // 100 % 100).astype(df['month'].dtype),
+            'day': (dates % 100).astype(df['day'].dtype),
+        })
+        for i, element in enumerate(self.ghcnd_elements):
+            wide[element.lower()] = values[i]
+        return wide
+
     @staticmethod
     def join_stations_elements(df, stations):
         df = pd.merge(df, stations, how='inner', on='station_id')
@@ -330,48 +1091,41 @@ class Datalake:
         #gdf.drop(columns=['longitude', 'latitude'], inplace=True)
         return gdf
 
-    @staticmethod
-    def generate_hexes(gdf):
-        # Creation of the hexagonal grid
-        #The input lat and lng are where the grid is centered - this can be moved to any lat, long - for example, over Califonia (lng = -119.45, lat = 37.17)
-        input_lng = -103
-        input_lat = 44
-
-        # Generate H3 hexagons at a specified resolution - a larger resolution means smaller cell size
-        resolution = 3
-
-        # Indicate the number of rings around the central hexagon - larger ring size means more area of the map will be covered
-        ring_size = 25
-
-        # Get the H3 hexagon for the center point
-        center_h3 = h3.latlng_to_cell(input_lat, input_lng, resolution)
-
-        # Generate hexagons within a disk around the center (instead of just rings)
-        hexagons = list(h3.grid_disk(center_h3, ring_size))  # All hexagons within the distance
-
-        # Create a GeoDataFrame with hexagons and their corresponding geometries
-        hexagon_geometries = [Polygon(h3.cell_to_boundary(hexagon)) for hexagon in hexagons]
+    @classmethod
+    def assign_hexes(cls, latitudes, longitudes):
+        """
+        Returns the H3 cell of every coordinate pair, coordinates outside the hexagon grid get NaN
+        """
+        grid = _hex_grid(cls.hex_resolution, *cls.hex_center, cls.hex_ring_size)
+        cells = [h3.latlng_to_cell(lat, lng, cls.hex_resolution) for lat, lng in zip(latitudes, longitudes)]
+        return np.array([cell if cell in grid else np.nan for cell in cells], dtype=object)
 
-        # Create the GeoDataFrame
-        hexagon_df = gpd.GeoDataFrame({'Hexagon_ID': hexagons, 'geometry': hexagon_geometries},  crs="EPSG:4326")
+    @classmethod
+    def generate_hexes(cls, gdf):
+        """
+        Adds the Hexagon_ID of every observation. Cells are looked up once per station with h3 instead of
+        spatially joining every row against the hexagon polygons, daily rows joined with query_stations
+        already carry them.
+        """
+        if 'Hexagon_ID' not in gdf.columns:
+            stations = gdf.drop_duplicates('station_id')
+            station_hexes = pd.Series(cls.assign_hexes(stations['latitude'], stations['longitude']),
+                                      index=stations['station_id'])
+            gdf = gdf.assign(Hexagon_ID=gdf['station_id'].map(station_hexes))
 
+        # Points keep the (lat, lng) order of the h3 hexagon polygons
+        hex_ids = gdf.pop('Hexagon_ID')
         gdf = gpd.GeoDataFrame(gdf, geometry=gpd.points_from_xy(gdf['latitude'], gdf['longitude']),  crs="EPSG:4326")
-
-        if gdf.crs != hexagon_df.crs:
-            gdf = gdf.to_crs(hexagon_df.crs)
-        # Perform spatial join
-        joined = gpd.sjoin(gdf, hexagon_df, how='left', predicate='intersects')
-
-        # Return only the original DataFrame with the new Hexagon_ID column
-        gdf['Hexagon_ID'] = joined['Hexagon_ID'].values
+        gdf['Hexagon_ID'] = hex_ids.values
 
         return gdf
 
-    def clean_daily_file(self, raw_path, clean_path):
+    def clean_daily_file(self, raw_path, clean_path, stations=None):
         """
         Clean a single daily file. each cleaning step should be a sub function
         :param raw_path:
         :param clean_path:
+        :param stations: stations table, read with query_stations when not given
         """
         daily_dtypes = {'station_id': 'str', 'element': pd.CategoricalDtype(), 'm_flag': pd.CategoricalDtype(),
                         'q_flag': pd.CategoricalDtype(), 's_flag': pd.CategoricalDtype(), 'date': str, 'time': str,
@@ -379,21 +1133,98 @@ class Datalake:
         df = pd.read_csv(raw_path, header=None,
                          names=['station_id', 'date', 'element', 'value', 'm_flag', 'q_flag', 's_flag', 'time'],
                          dtype=daily_dtypes, engine='pyarrow')
+        gdf = self.clean_daily_frame(df, self.query_stations() if stations is None else stations)
+        pq.write_table(compact_ghcnd(geoparquet_table(gdf)), clean_path)
+
+    def clean_daily_frame(self, df, stations):
+        """
+        Runs the daily cleaning steps on a long format frame of observations
+        :param df: raw daily observations
+        :param stations: stations table from query_stations
+        """
         # daily file cleaning steps:
         # 4. process dates
         df = self.process_dates(df)
         # 2. drop unwanted columns
         df = self.drop_daily_columns(df)
-        # 5. create element table
-        df = self.create_element_tables(df)
-        # 6. join elements into single table
-        df = self.join_element_tables(df)
+        # 5./6. pivot elements into a single wide table
+        df = self.pivot_elements(df)
         # 7. join with stations
-        df = self.join_stations_elements(df, self.query_stations())
+        df = self.join_stations_elements(df, stations)
         # 8. drop unwanted columns
         df = self.drop_station_columns(df)
         # 9. generate geometries
         gdf = self.generate_geometries(df)
         #10. Generate h3 cells
         gdf = self.generate_hexes(gdf)
-        gdf.to_parquet(clean_path)
+        return gdf
+
+    def stream_daily_file(self, raw_path, clean_path, stations=None, block_size=64 * 1024 * 1024):
+        """
+        Streaming version of clean_daily_file. The csv is read in record batches, rows are filtered to
+        ghcnd_elements and US/CA/MX stations before they reach pandas, and each cleaned batch is appended to the
+        parquet file so peak memory is bounded by block_size instead of the size of the year.
+        The file is written to a temporary path and only replaces clean_path once every batch is written.
+        :param raw_path:
+        :param clean_path:
+        :param stations: stations table, read with query_stations when not given
+        :param block_size: bytes of csv decoded per batch
+        """
+        if stations is None:
+            stations = self.query_stations()
+        reader = pv.open_csv(
+            raw_path,
+            read_options=pv.ReadOptions(
+                column_names=['station_id', 'date', 'element', 'value', 'm_flag', 'q_flag', 's_flag', 'time'],
+                block_size=block_size),
+            convert_options=pv.ConvertOptions(
+                column_types={'station_id': pa.string(), 'date': pa.string(), 'element': pa.string(),
+                              'value': pa.float64()},
+                include_columns=['station_id', 'date', 'element', 'value']))
+        elements = pa.array(self.ghcnd_elements)
+        countries = pa.array(['US', 'CA', 'MX'])
+
+        clean_path = Path(clean_path)
+        tmp_path = clean_path.with_name(clean_path.name + '.tmp')
+        writer = None
+        carry = None
+        try:
+            for batch in reader:
+                keep = pc.and_(pc.is_in(batch.column('element'), value_set=elements),
+                               pc.is_in(pc.utf8_slice_codeunits(batch.column('station_id'), 0, 2), value_set=countries))
+                df = batch.filter(keep).to_pandas()
+                if carry is not None:
+                    df = pd.concat([carry, df], ignore_index=True)
+                if df.empty:
+                    continue
+
+                # The elements of a station-day are contiguous but can straddle two batches,
+                # hold the last station-day back until the next batch so it is pivoted in one piece
+                last = (df['station_id'] == df['station_id'].iat[-1]) & (df['date'] == df['date'].iat[-1])
+                carry = df[last].copy()
+                writer = self._write_daily_batch(writer, self.clean_daily_frame(df[~last].copy(), stations),
+                                                 tmp_path)
+
+            if carry is not None and not carry.empty:
+                writer = self._write_daily_batch(writer, self.clean_daily_frame(carry, stations), tmp_path)
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_path, clean_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+
+    def _write_daily_batch(self, writer, gdf, path):
+        """
+        Appends a cleaned batch to a GeoParquet file, opening the writer with the schema of the first batch
+        (see _batch_schema)
+        """
+        if gdf.empty:
+            return writer
+        table = compact_ghcnd(geoparquet_table(gdf))
+        if writer is None:
+            writer = pq.ParquetWriter(path, self._batch_schema(table.schema))
+        writer.write_table(table.cast(writer.schema))
+        return writer
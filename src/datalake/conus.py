@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+
+class ConusIndex:
+    """
+    Assigns geometries to the state that contains them.
+    Each state is simplified and buffered twice: a shrunken copy whose hits are certainly inside the state and a
+    grown copy whose misses are certainly outside. Only candidates between the two, close to a border, are tested
+    against the exact state polygon. An STRtree over the grown copies finds the candidate states of each geometry.
+    """
+
+    def __init__(self, states, tolerance=0.01):
+        """
+        :param states: GeoDataFrame with 'code' and 'geometry' columns, e.g. Datalake.query_states()
+        :param tolerance: simplification tolerance in degrees, the buffers are twice as wide
+        """
+        self.crs = states.crs
+        self.total_bounds = states.total_bounds
+        self.codes = states['code'].to_numpy()
+        self.exact = np.asarray(states.geometry.values, dtype=object)
+        simplified = shapely.simplify(self.exact, tolerance, preserve_topology=True)
+        self.inner = shapely.buffer(simplified, -2 * tolerance)
+        self.outer = shapely.buffer(simplified, 2 * tolerance)
+        for geometries in (self.exact, self.inner, self.outer):
+            shapely.prepare(geometries)
+        self.tree = STRtree(self.outer)
+
+    def state_codes(self, geometries) -> np.ndarray:
+        """
+        State code of each geometry, None when it is not within a state.
+        A polygon crossing a border is within CONUS but not within one state, it gets the code of the state
+        holding most of its area.
+        :param geometries: GeoSeries or array of shapely geometries in the states' CRS
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        codes = np.full(len(geometries), None, dtype=object)
+        input_idx, tree_idx = self.tree.query(geometries)
+        is_point = shapely.get_type_id(geometries) == 0
+
+        unresolved = []
+        for state in np.unique(tree_idx):
+            candidates = input_idx[tree_idx == state]
+            candidates = candidates[codes[candidates] == None]  # noqa: E711, a point is only inside one state
+            points = candidates[is_point[candidates]]
+            others = candidates[~is_point[candidates]]
+
+            x, y = shapely.get_x(geometries[points]), shapely.get_y(geometries[points])
+            inside = shapely.contains_xy(self.inner[state], x, y)
+            border = ~inside & shapely.contains_xy(self.outer[state], x, y)
+            inside[border] = shapely.contains_xy(self.exact[state], x[border], y[border])
+            codes[points[inside]] = self.codes[state]
+
+            inside = shapely.contains(self.inner[state], geometries[others])
+            border = ~inside & shapely.intersects(self.outer[state], geometries[others])
+            inside[border] = shapely.within(geometries[others][border], self.exact[state])
+            codes[others[inside]] = self.codes[state]
+            unresolved.extend(others[border & ~inside])
+
+        for i in np.unique(unresolved).astype(int):
+            if codes[i] is None:
+                self._assign_across_borders(geometries, codes, i, tree_idx[input_idx == i])
+        return codes
+
+    def tag(self, gdf, column='state') -> pd.Series:
+        """
+        State code of each row of a GeoDataFrame as a Series aligned with it, reprojecting to the states' CRS first
+        """
+        geometries = gdf.geometry if gdf.crs is None or gdf.crs == self.crs else gdf.geometry.to_crs(self.crs)
+        return pd.Series(self.state_codes(geometries.values), index=gdf.index, name=column)
+
+    def _assign_across_borders(self, geometries, codes, i, states):
+        """
+        Exact within test of a geometry against the union of its candidate states
+        """
+        geometry = geometries[i]
+        if not shapely.within(geometry, shapely.union_all(self.exact[states])):
+            return
+        overlaps = shapely.area(shapely.intersection(self.exact[states], geometry))
+        codes[i] = self.codes[states[np.argmax(overlaps)]]
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Downloader:
+    """
+    Concurrent, resumable file downloader sharing one requests.Session connection pool.
+    Every file is streamed to a .part file next to its destination and atomically renamed once complete,
+    an interrupted download is resumed with an HTTP Range request, and files whose ETag and size match the
+    copy on disk are skipped.
+    """
+
+    def __init__(self, workers=4, retries=3, chunk_size=64 * 1024, timeout=60):
+        """
+        :param workers: number of files downloaded at the same time
+        :param retries: attempts per file before giving up, partial data is kept between attempts
+        :param chunk_size: bytes written per chunk
+        :param timeout: seconds to wait for the server before an attempt fails
+        """
+        self.workers = workers
+        self.retries = retries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def remote_version(self, url) -> dict:
+        """
+        ETag, size and modification time of a remote file
+        """
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        headers = response.headers
+        content_length = headers.get('content-length')
+        return {'etag': headers.get('etag'), 'last_modified': headers.get('last-modified'),
+                'content_length': int(content_length) if content_length is not None else None,
+                'accept_ranges': headers.get('accept-ranges') == 'bytes'}
+
+    def is_up_to_date(self, dest_path, remote, recorded=None) -> bool:
+        """
+        A file on disk is up to date when its size matches the remote Content-Length and its ETag matches either
+        the ETag recorded when it was downloaded or, for single part S3 uploads, the md5 of the file
+        :param recorded: remote version recorded when the file was last downloaded
+        """
+        dest_path = Path(dest_path)
+        if not dest_path.exists() or remote['etag'] is None:
+            return False
+        if remote['content_length'] is not None and dest_path.stat().st_size != remote['content_length']:
+            return False
+        if recorded and recorded.get('etag') == remote['etag']:
+            return True
+        etag = remote['etag'].strip('"')
+        return len(etag) == 32 and '-' not in etag and self._md5(dest_path) == etag
+
+    def fetch(self, url, dest_path, remote=None) -> dict:
+        """
+        Downloads one file, resuming a previous partial download when the server supports it
+        :param remote: remote version from remote_version, fetched when not given
+        :return: the remote version of the downloaded file
+        """
+        dest_path = Path(dest_path)
+        remote = remote or self.remote_version(url)
+        part_path = dest_path.with_name(dest_path.name + '.part')
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._fetch_part(url, part_path, remote)
+                break
+            except (requests.RequestException, IOError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f'Retrying {url} ({attempt}/{self.retries}): {e}')
+                time.sleep(2 ** attempt)
+
+        if remote['content_length'] is not None and part_path.stat().st_size != remote['content_length']:
+            raise IOError(f'{url} ended after {part_path.stat().st_size} of {remote["content_length"]} bytes')
+        os.replace(part_path, dest_path)
+        return remote
+
+    def sync(self, url, dest_path, recorded=None, force=False, dry_run=False) -> tuple[str, dict]:
+        """
+        Looks up the remote version of one file and downloads it unless the copy on disk is up to date
+        :param recorded: remote version recorded when the file was last downloaded
+        :param force: download the file even if it is up to date
+        :param dry_run: only report whether the file would be downloaded
+        :return: ('up to date', 'would download' or 'downloaded', remote version)
+        """
+        remote = self.remote_version(url)
+        if not force and self.is_up_to_date(dest_path, remote, recorded):
+            return 'up to date', remote
+        if dry_run:
+            return 'would download', remote
+        Path(dest_path).parent.mkdir(parents=True, exist_ok=True)
+        return 'downloaded', self.fetch(url, dest_path, remote)
+
+    def sync_all(self, jobs, force=False, dry_run=False):
+        """
+        Syncs many files concurrently, see sync. Each file's HEAD request runs in its own job, a failing file is
+        reported without stopping the others.
+        :param jobs: iterable of (url, dest_path, recorded) tuples, recorded may be None
+        :return: generator of (url, dest_path, (status, remote version) or exception) as files finish
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.sync, url, dest_path, recorded, force, dry_run): (url, dest_path)
+                       for url, dest_path, recorded in jobs}
+            for future in as_completed(futures):
+                url, dest_path = futures[future]
+                try:
+                    yield url, dest_path, future.result()
+                except Exception as e:
+                    yield url, dest_path, e
+
+    def _fetch_part(self, url, part_path, remote):
+        """
+        Streams a url into its .part file, continuing from the bytes already written when possible.
+        If-Range makes the server send the whole file again if it changed since the partial download started.
+        """
+        headers = {}
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if offset and remote['content_length'] is not None:
+            if offset == remote['content_length']:
+                # Complete, the process stopped between the download and the rename
+                return
+            if offset > remote['content_length']:
+                part_path.unlink()
+                offset = 0
+        if offset and remote['accept_ranges'] and remote['etag']:
+            headers = {'Range': f'bytes={offset}-', 'If-Range': remote['etag']}
+
+        print(f'Downloading {url}' + (f' from byte {offset}' if headers else ''))
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # The range starts at or past the end of the remote file: either the part is already complete, or
+                # it is longer than the remote file and is downloaded again
+                size = response.headers.get('content-range', '').rpartition('/')[2]
+                if size.isdigit() and int(size) == offset:
+                    return
+                part_path.unlink()
+                return self._fetch_part(url, part_path, remote)
+            response.raise_for_status()
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(part_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+
+    @staticmethod
+    def _md5(path) -> str:
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
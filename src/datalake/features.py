@@ -0,0 +1,51 @@
+import h3
+import numpy as np
+
+# Daily GHCN-D elements averaged per hexagon, the model uses their 3-day averages
+feature_columns = ['tmax', 'tmin', 'prcp', 'snow', 'awnd']
+
+
+def hex_neighbors(cells, rings=1) -> np.ndarray:
+    """
+    Positions of the grid_disk neighbours of every cell, -1 where a neighbour is outside the grid
+    :param cells: sorted array of H3 cell ids
+    :param rings: neighbour distance
+    :return: (len(cells), disk size) int array, the cell itself excluded
+    """
+    size = 3 * rings * (rings + 1)
+    neighbors = np.full((len(cells), size), -1, dtype=np.int64)
+    for i, cell in enumerate(cells):
+        disk = np.array([neighbor for neighbor in h3.grid_disk(cell, rings) if neighbor != cell])
+        positions = np.searchsorted(cells, disk)
+        inside = (positions < len(cells)) & (cells[np.minimum(positions, len(cells) - 1)] == disk)
+        neighbors[i, :inside.sum()] = positions[inside]
+    return neighbors
+
+
+def impute_from_neighbors(values, neighbors) -> np.ndarray:
+    """
+    Fills missing values of a day with the mean of the cell's neighbours that have a value
+    :param values: (days, cells, features) array with NaN where a cell has no value
+    :param neighbors: hex_neighbors of the cells
+    """
+    gathered = values[:, neighbors, :]
+    gathered[:, neighbors < 0, :] = np.nan
+    observed = ~np.isnan(gathered)
+    count = observed.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        neighbor_mean = np.where(observed, gathered, 0).sum(axis=2) / count
+    return np.where(np.isnan(values), neighbor_mean, values)
+
+
+def rolling_mean(values, window=3, min_periods=2) -> np.ndarray:
+    """
+    Trailing mean over the previous window days, NaN where fewer than min_periods days have a value
+    :param values: (days, cells, features) array of consecutive days
+    :return: array of the same shape, the first window - 1 days only see the days before them in values
+    """
+    padded = np.concatenate([np.full((window - 1,) + values.shape[1:], np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+    observed = ~np.isnan(windows)
+    counts = observed.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts >= min_periods, np.where(observed, windows, 0).sum(axis=-1) / counts, np.nan)
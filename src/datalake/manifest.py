@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+class Manifest:
+    """
+    Build manifest stored under the datalake root.
+    Records, for every artifact, the size/mtime/sha256 of its sources, the code version that built it and its output
+    path, so rebuilds can skip artifacts whose inputs have not changed.
+    Artifacts and sources are identified by their path relative to the datalake root.
+    """
+
+    def __init__(self, datalake_root, code_version, path='manifest.json'):
+        self.datalake_root = Path(datalake_root)
+        self.code_version = code_version
+        self.path = self.datalake_root / path
+        self.entries = self._load()
+
+    def is_up_to_date(self, artifact, sources) -> bool:
+        """
+        An artifact is up to date when its output exists, it was built by the current code version and none of
+        its sources changed since. Sources are only hashed when their size or mtime changed.
+        """
+        entry = self.entries.get(artifact)
+        if entry is None or entry.get('code_version') != self.code_version:
+            return False
+        if not (self.datalake_root / entry['output']).exists():
+            return False
+        if set(entry['sources']) != set(sources):
+            return False
+        touched = False
+        for source in sources:
+            recorded = entry['sources'][source]
+            path = self.datalake_root / source
+            if not path.exists():
+                return False
+            stat = path.stat()
+            if stat.st_size != recorded['size']:
+                return False
+            if stat.st_mtime != recorded['mtime']:
+                if self._sha256(path) != recorded['sha256']:
+                    return False
+                # Same content with a new mtime, remember it so the file is not hashed again next time
+                recorded['mtime'] = stat.st_mtime
+                touched = True
+        if touched:
+            self.save()
+        return True
+
+    def record(self, artifact, sources, output=None, **details):
+        """
+        Records a successful build of an artifact and saves the manifest
+        :param artifact: artifact key, usually its output path
+        :param sources: source paths the artifact was built from
+        :param output: output path, defaults to the artifact key
+        :param details: extra values stored with the entry, e.g. download headers
+        """
+        self.entries[artifact] = {
+            'output': output or artifact,
+            'code_version': self.code_version,
+            'sources': {source: self._fingerprint(self.datalake_root / source) for source in sources},
+            'built': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **details,
+        }
+        self.save()
+
+    def get(self, artifact) -> dict:
+        return self.entries.get(artifact, {})
+
+    def save(self):
+        """
+        Writes the manifest atomically so an interrupted build never leaves it half written
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    @classmethod
+    def _fingerprint(cls, path) -> dict:
+        stat = path.stat()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': cls._sha256(path)}
+
+    @staticmethod
+    def _sha256(path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
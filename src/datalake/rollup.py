@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .schema import compact_model_output
+from .scoring import min_max_by_day, normalize_probability, output_columns
+
+# Periods the daily model output is rolled up to, each is identified by its first day
+granularities = ['week', 'month', 'season']
+# Values aggregated per hexagon and period
+rollup_values = ['Predicted Fire Probability', *output_columns.values(), 'Average Elevation']
+# Aggregates of every value, a column is named '<value> (<statistic>)'
+rollup_statistics = ['mean', 'max', 'p90']
+# Meteorological seasons start in December, March, June and September
+_season_names = {12: 'Winter', 3: 'Spring', 6: 'Summer', 9: 'Fall'}
+
+
+def period_start(day, granularity) -> pd.Timestamp:
+    """
+    First day of the week (starting Monday), month or meteorological season holding a day
+    """
+    day = pd.Timestamp(day).normalize()
+    if granularity == 'week':
+        return day - pd.Timedelta(days=day.dayofweek)
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'season':
+        # January and February belong to the winter starting the December before
+        month = day.month - day.month % 3
+        return pd.Timestamp(day.year, month, 1) if month else pd.Timestamp(day.year - 1, 12, 1)
+    raise ValueError(f'Unknown granularity {granularity}, expected one of {granularities}')
+
+
+def period_days(start, granularity) -> pd.DatetimeIndex:
+    """
+    Every day of the period starting on start
+    """
+    start = pd.Timestamp(start)
+    if granularity == 'week':
+        return pd.date_range(start, periods=7)
+    months = 1 if granularity == 'month' else 3
+    return pd.date_range(start, start + pd.DateOffset(months=months) - pd.Timedelta(days=1))
+
+
+def period_label(start, granularity) -> str:
+    """
+    Name of a period shown next to the date slider, e.g. 'Week of 2021-06-07', 'June 2021' or 'Summer 2021'
+    """
+    start = pd.Timestamp(start)
+    if granularity == 'week':
+        return f'Week of {start:%Y-%m-%d}'
+    if granularity == 'month':
+        return f'{start:%B %Y}'
+    # Winter is named after the year its January and February fall in
+    return f'{_season_names[start.month]} {start.year + (start.month == 12)}'
+
+
+def rollup_table(df, start) -> pa.Table:
+    """
+    Aggregates the daily model output rows of one period per hexagon. Every aggregate also gets a
+    'Normalized <column>' copy scaled over the period's hexagons like the daily values are scaled over a day
+    :param df: model output rows of every day of the period
+    :param start: first day of the period, stored as the rows' date
+    """
+    grouped = df.groupby('Hexagon_ID', sort=True)[rollup_values]
+    aggregates = pd.concat({'mean': grouped.mean(), 'max': grouped.max(), 'p90': grouped.quantile(0.9)}, axis=1)
+    aggregates.columns = [f'{value} ({statistic})' for statistic, value in aggregates.columns]
+    aggregates = aggregates.reset_index()
+    aggregates.insert(1, 'date', pd.Timestamp(start))
+
+    starts = np.array([0])
+    for column in aggregates.columns[2:]:
+        values = aggregates[column].to_numpy(dtype=np.float64)
+        normalize = normalize_probability if column.startswith('Predicted Fire Probability') else min_max_by_day
+        aggregates[f'Normalized {column}'] = normalize(values, starts)
+    return compact_model_output(pa.Table.from_pandas(aggregates, preserve_index=False))
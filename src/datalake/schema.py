@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import shapely
+
+import h3
+
+# Compact column types written by the datalake and read back by the dashboard.
+# H3 cells are stored as their 64 bit integer form, repeated strings are dictionary encoded and GHCN-D values keep
+# their native integer units (tenths of mm, °C and m/s, mm of snow) which fit an int16.
+hexagon_type = pa.uint64()
+dictionary_type = pa.dictionary(pa.int32(), pa.string())
+value_type = pa.int16()
+ghcnd_value_columns = ['prcp', 'snow', 'snwd', 'tmax', 'tmin', 'awnd', 'awdr', 'evap']
+ghcnd_types = {'station_id': dictionary_type, 'state': dictionary_type, 'Hexagon_ID': hexagon_type,
+               'year': pa.int16(), 'month': pa.int8(), 'day': pa.int8(), 'elevation': pa.float32(),
+               **{column: value_type for column in ghcnd_value_columns}}
+# Model output columns that are not float32 values, the dashboard reads a single date instead of year/month/day
+model_output_types = {'Hexagon_ID': hexagon_type, 'date': pa.date32(), 'Fire Occurred?': pa.int8()}
+model_output_dropped = ['geometry', 'year', 'month', 'day', '__index_level_0__']
+
+
+def hexagon_ints(cells) -> pa.Array:
+    """
+    H3 cell ids as uint64. Missing cells become 0, H3's null index, rather than nulls so the column stays uint64 in
+    pandas instead of turning into float64. Each distinct cell is converted once.
+    :param cells: H3 cell id strings, or integers which are only cast
+    """
+    if isinstance(cells, (pa.Array, pa.ChunkedArray)):
+        if pa.types.is_integer(cells.type):
+            return pc.cast(cells.fill_null(0), hexagon_type)
+        cells = cells.to_numpy(zero_copy_only=False)
+    cells = np.asarray(cells)
+    if np.issubdtype(cells.dtype, np.integer):
+        return pa.array(cells.astype(np.uint64), type=hexagon_type)
+    codes, uniques = pd.factorize(pd.Series(cells, dtype=object))
+    ints = np.array([h3.str_to_int(cell) for cell in uniques] + [0], dtype=np.uint64)
+    return pa.array(ints[codes], type=hexagon_type)
+
+
+def hexagon_strings(cells) -> np.ndarray:
+    """
+    uint64 H3 cell ids back to the strings h3 and the hexagon GeoJSON layer use, None for 0
+    """
+    codes, uniques = pd.factorize(np.asarray(cells))
+    strings = np.array([h3.int_to_str(int(cell)) if cell else None for cell in uniques] + [None], dtype=object)
+    return strings[codes]
+
+
+def compact_ghcnd(table) -> pa.Table:
+    """
+    Casts a clean or curated daily GHCN-D table to the compact types, columns it does not know keep theirs
+    """
+    for name, target in ghcnd_types.items():
+        if name in table.column_names:
+            table = table.set_column(table.schema.get_field_index(name), name, _cast(table[name], target, name))
+    return table
+
+
+def compact_model_output(table) -> pa.Table:
+    """
+    Casts a model output table to the compact types the dashboard keeps in memory: uint64 Hexagon_ID, one date32
+    date, an int8 fire flag and float32 values. Geometry and the year/month/day columns are dropped.
+    """
+    table = table.drop_columns([name for name in model_output_dropped if name in table.column_names])
+    table = table.replace_schema_metadata(None)
+    for i, field in enumerate(table.schema):
+        target = model_output_types.get(field.name, pa.float32())
+        table = table.set_column(i, field.name, _cast(table[field.name], target, field.name))
+    return table
+
+
+def geoparquet_table(gdf, covering_bbox=False) -> pa.Table:
+    """
+    GeoDataFrame as an Arrow table with GeoParquet metadata, for pq.write_table and ParquetWriter. The geometry is
+    converted with the public GeoDataFrame.to_arrow as WKB, the file level geo metadata is added here.
+    :param covering_bbox: append a bbox struct column registered as the geometry's covering, so readers can skip row
+        groups using its statistics
+    """
+    table = pa.table(gdf.to_arrow(index=False))
+    name = gdf.geometry.name
+    geometries = gdf.geometry.to_numpy()
+    present = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    drawn = gdf.geometry[present]
+    crs = gdf.crs.to_json_dict() if gdf.crs else None
+    # Like geopandas, member ids of a datum ensemble are dropped, PROJ < 9.2 cannot read them back
+    for member in (crs or {}).get('datum_ensemble', {}).get('members', []):
+        member.pop('id', None)
+    column = {'encoding': 'WKB', 'crs': crs,
+              'geometry_types': sorted({geom_type + (' Z' if has_z else '')
+                                        for geom_type, has_z in zip(drawn.geom_type, drawn.has_z)})}
+    if present.any():
+        column['bbox'] = shapely.total_bounds(geometries).tolist()
+    if covering_bbox:
+        bounds = shapely.bounds(geometries)
+        table = table.append_column('bbox', pa.StructArray.from_arrays(
+            [pa.array(bounds[:, i], from_pandas=True) for i in range(4)], names=['xmin', 'ymin', 'xmax', 'ymax']))
+        column['covering'] = {'bbox': {key: ['bbox', key] for key in ('xmin', 'ymin', 'xmax', 'ymax')}}
+    geo = {'version': '1.1.0' if covering_bbox else '1.0.0', 'primary_column': name, 'columns': {name: column}}
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b'geo': json.dumps(geo).encode()})
+
+
+def _cast(column, target, name):
+    """
+    Casts one column to its compact type. Integer targets are only as wide as the valid values, values outside
+    their range (e.g. a corrupt 5 digit GHCN-D value in an int16 column) become nulls and are reported.
+    """
+    if column.type == target:
+        return column
+    if target == hexagon_type:
+        return hexagon_ints(column)
+    if pa.types.is_dictionary(target):
+        return pc.cast(column, target.value_type).dictionary_encode()
+    if pa.types.is_floating(column.type) and pa.types.is_integer(target):
+        # NaN is not null in Arrow, round the floats written by pandas and turn their NaN into nulls
+        column = pc.if_else(pc.is_nan(column), None, pc.round(column))
+    if (pa.types.is_floating(column.type) or pa.types.is_integer(column.type)) and pa.types.is_integer(target):
+        limits = np.iinfo(target.to_pandas_dtype())
+        outside = pc.or_(pc.less(column, limits.min), pc.greater(column, limits.max))
+        count = pc.sum(outside).as_py() or 0
+        if count:
+            print(f'OUT OF RANGE: {count} {name} values outside {target}, set to null')
+            column = pc.if_else(outside, None, column)
+    return pc.cast(column, target)
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+from .schema import hexagon_strings
+
+# Model inputs in the order the random forest was trained on
+model_features = ['Hexagon_ID_encoded', 'tmax_avg', 'tmin_avg', 'prcp_avg', 'snow_avg', 'awnd_avg', 'month_encoded']
+# Feature table columns written to the model output, under the names the dashboard reads
+output_columns = {'tmax_avg': 'Temperature Maximum (3-Day Average)', 'tmin_avg': 'Temperature Minimum (3-Day Average)',
+                  'prcp_avg': 'Precipitation (3-Day Average)', 'snow_avg': 'Snowfall (3-Day Average)',
+                  'awnd_avg': 'Daily Average Wind (3-Day Average)'}
+
+
+class ModelScorer:
+    """
+    Scores feature rows with the serialized random forest, loaded once. Every predict call scores a whole batch of
+    days in one predict_proba call whose trees are evaluated on n_jobs cores.
+    The model file holds either the fitted estimator or a dict {'model': estimator, 'hexagon_classes': ...,
+    'month_classes': ...} with the classes_ of the LabelEncoders the training notebook fitted on Hexagon_ID and
+    month. A bare estimator gets the sorted grid cells and months 1-12, the classes those encoders learn when every
+    cell and month is in the training data.
+    """
+
+    def __init__(self, model_path, cells, n_jobs=-1):
+        """
+        :param model_path: joblib file written by the training notebook
+        :param cells: sorted H3 cell ids of the hexagon grid
+        :param n_jobs: cores used by predict_proba, -1 uses all of them
+        """
+        # Imported here, the dashboard reads the datalake schema but its image does not ship the model libraries
+        import joblib
+
+        bundle = joblib.load(model_path)
+        if not isinstance(bundle, dict):
+            bundle = {'model': bundle}
+        self.model = bundle['model']
+        self.model.n_jobs = n_jobs
+        self.hexagon_classes = np.asarray(bundle.get('hexagon_classes', cells))
+        self.month_classes = np.asarray(bundle.get('month_classes', np.arange(1, 13)))
+
+    def predict(self, features, starts) -> np.ndarray:
+        """
+        Fire probability of every feature row. Missing averages are filled with the mean of their day, the
+        notebook filled them with the mean of the scored set.
+        :param features: frame sorted by date with Hexagon_ID, date and the *_avg feature columns
+        :param starts: first row of each day, see day_starts
+        """
+        averages = features[model_features[1:-1]].to_numpy(dtype=np.float64)
+        means = np.repeat(_nanmean_by_day(averages, starts), np.diff(np.r_[starts, len(averages)]), axis=0)
+        averages = np.where(np.isnan(averages), means, averages)
+
+        X = pd.DataFrame(averages, columns=model_features[1:-1])
+        X.insert(0, 'Hexagon_ID_encoded', _encode(self.hexagon_classes, hexagon_strings(features['Hexagon_ID']),
+                                                  'Hexagon_ID'))
+        X['month_encoded'] = _encode(self.month_classes, features['date'].dt.month.to_numpy(), 'month')
+        return self.model.predict_proba(X)[:, 1]
+
+
+def day_starts(dates) -> np.ndarray:
+    """
+    First row of each day of a date-sorted column
+    """
+    days = np.asarray(dates, dtype='datetime64[D]')
+    return np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+
+
+def min_max_by_day(values, starts) -> np.ndarray:
+    """
+    Scales the values of each day to 0-1 by that day's minimum and maximum, NaN stays NaN and a day whose values
+    are all equal maps to 0
+    """
+    counts = np.diff(np.r_[starts, len(values)])
+    low = np.repeat(np.fmin.reduceat(values, starts), counts)
+    span = np.repeat(np.fmax.reduceat(values, starts), counts) - low
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(np.isnan(values), np.nan, np.where(span > 0, (values - low) / span, 0.0))
+
+
+def normalize_probability(probability, starts) -> np.ndarray:
+    """
+    Per-day normalization of the training notebook: min/max scaled, shifted so the day's mean is 0.5 and clipped to 0-1
+    """
+    normalized = min_max_by_day(probability, starts)
+    counts = np.diff(np.r_[starts, len(normalized)])
+    normalized += 0.5 - np.repeat(np.add.reduceat(normalized, starts) / counts, counts)
+    return np.clip(normalized, 0, 1)
+
+
+def _nanmean_by_day(values, starts) -> np.ndarray:
+    observed = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.add.reduceat(np.where(observed, values, 0), starts) / np.add.reduceat(observed, starts)
+
+
+def _encode(classes, values, name) -> np.ndarray:
+    """
+    LabelEncoder.transform over sorted classes
+    """
+    positions = np.minimum(np.searchsorted(classes, values), len(classes) - 1)
+    unknown = classes[positions] != values
+    if unknown.any():
+        raise ValueError(f'{unknown.sum()} rows have a {name} the model was not trained on, e.g. {values[unknown][0]}')
+    return positions
@@ -1,43 +1,75 @@
 import json
 import os
-import glob
 import sys
+import tempfile
 from datetime import date
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import quote, urlencode
 
 import dash
 import dash_bootstrap_components as dbc
 import dash_leaflet as dl
-from dash import Output, Input, html, dcc, State
+from dash import ClientsideFunction, Output, Input, html, dcc, State
+from flask import abort, jsonify, request, send_file
 
+import h3
 from h3 import latlng_to_cell
 
 # sys.path.append(str(Path(__file__).parent))
 # sys.path.append(str(Path(__file__).parent / 'app'))
 
-from app import generate_layers, generate_colorbar
+from app import generate_layers, generate_colorbar, generate_hex_colors, generate_hex_layer, generate_hex_geojson, \
+    get_field_identifier, HexHistoryStore, LayerCache, MappedModelOutputStore, ModelOutputStore, \
+    RollupStore, GRID_RESOLUTION, aggregate_to_resolution, color_key, generate_hex_features, grid_cells, \
+    parent_aggregations, resolution_for_zoom, viewport_cells, MAX_TILE_ZOOM, PYRAMID_RESOLUTIONS, TileCache, \
+    render_tile
+from datalake.rollup import granularities, period_label, rollup_statistics
 from app.utils import *
 import geopandas as gpd
 import pandas as pd
+import plotly.io as pio
 
 # Initialization
 
 #ASSETS_ROOT = Path("C:/FinalProjectDS4010A")
 
 ASSETS_ROOT = Path(os.getenv('ASSETS_ROOT'))
-CELL_RESOLUTION = 3
 
 assets_root = os.getenv('ASSETS_ROOT', 'assets')
 
-# Find all Parquet files in the directory
-parquet_files = glob.glob(os.path.join(assets_root, '*.parquet'))
+# Indexes the Parquet files by date, each day is only read when it is first requested.
+# If a consolidated Arrow file is deployed it is memory-mapped instead so all workers share one copy
+cache_size = int(os.getenv('MODEL_OUTPUT_CACHE_SIZE', 32))
+model_output_arrow = os.getenv('MODEL_OUTPUT_ARROW')
+if model_output_arrow and os.path.exists(model_output_arrow):
+    store = MappedModelOutputStore(model_output_arrow, cache_size=cache_size)
+else:
+    store = ModelOutputStore(assets_root, cache_size=cache_size)
 
-# Load and concatenate all Parquet files
-data = gpd.GeoDataFrame(pd.concat([gpd.read_parquet(file) for file in parquet_files], ignore_index=True))
+# Week, month and season aggregates written by the rollup pipeline, only the granularities that were built are offered
+rollup_stores = {granularity: RollupStore(assets_root, granularity, cache_size=cache_size)
+                 for granularity in granularities
+                 if any(Path(assets_root, 'rollups', granularity).glob('Rollup_*.parquet'))}
+
+# Changes whenever a day or period is added or rescored, cached layers of an older deploy are not served
+deploy_version = max([store.version, *(rollup_store.version for rollup_store in rollup_stores.values())])
 
 # Gets min and max date from the data
-min_date = data['date'].min().date()
-max_date = data['date'].max().date()
+min_date = store.min_date
+max_date = store.max_date
+
+# Hex-major copy of the model output the history chart reads a hexagon's whole series from, built offline with
+# scripts/consolidate_model_output.py --hex-history. Without it a history is read day by day from the store
+hex_history_path = os.getenv('HEX_HISTORY_ARROW', os.path.join(assets_root, 'hex_history.arrow'))
+if os.path.exists(hex_history_path):
+    hex_history = HexHistoryStore(hex_history_path)
+    if hex_history.max_date != max_date:
+        print(f'{hex_history_path} ends on {hex_history.max_date} but the model output on {max_date}, rebuild it with '
+              f'scripts/consolidate_model_output.py --hex-history')
+else:
+    print(f'{hex_history_path} not found, hexagon histories are read by scanning every model output partition')
+    hex_history = store
 
 # Generates Date Range
 date_range = pd.date_range(start=min_date, end=max_date, freq="D")
@@ -55,6 +87,123 @@ index_to_date = {i: d.date() for i, d in enumerate(date_range)}
 
 # Gets all available dates instead of timestamps
 available_dates = list(date_range.date)
+default_date = date(2020, 1, 1)
+
+# Rendered hex colors are cached per (date, field), optionally in a SQLite file shared by every worker
+layer_cache = LayerCache(
+    max_size=int(os.getenv('LAYER_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('LAYER_CACHE_TTL', 0)),
+    disk_path=os.getenv('LAYER_CACHE_PATH'),
+    version=deploy_version
+)
+
+
+def layer_key(date_str, granularity='day', statistic='mean', resolution=GRID_RESOLUTION):
+    """
+    Layer cache key of a day, or of the aggregate of the week, month or season holding it, drawn at a resolution of
+    the hexagon pyramid. Resolutions finer than the grid share its colors, their hexagons are colored by their parent
+    """
+    key = date_str
+    if granularity != 'day' and granularity in rollup_stores:
+        key = f'{granularity}/{statistic}/{rollup_stores[granularity].period_start(date_str)}'
+    if resolution < GRID_RESOLUTION:
+        key += f'@{resolution}'
+    return key
+
+
+def is_deployed_layer(key) -> bool:
+    """
+    Whether a layer cache key, e.g. one counted by an earlier deploy, names a day or period the stores hold
+    """
+    key, _, resolution = key.partition('@')
+    if resolution and (not resolution.isdigit() or int(resolution) not in PYRAMID_RESOLUTIONS):
+        return False
+    partitions = store.partitions
+    if '/' in key:
+        parts = key.split('/')
+        if len(parts) != 3 or parts[0] not in rollup_stores or parts[1] not in rollup_statistics:
+            return False
+        granularity, _, key = parts
+        partitions = rollup_stores[granularity].partitions
+    try:
+        return date.fromisoformat(key) in partitions
+    except ValueError:
+        return False
+
+
+def layer_colors(key, field, count=True) -> dict:
+    """
+    Hexagon_ID -> color mapping of a layer, rendered once per layer cache entry
+    :param count: whether this call counts as a user request for most_requested_dates
+    """
+    return layer_cache.get_or_render(key, field, lambda: render_hex_colors(key, field), count=count)['colors']
+
+
+def render_hex_colors(key, field):
+    key, _, resolution = key.partition('@')
+    if '/' not in key:
+        df, column = store.get_day(key), None
+    else:
+        granularity, statistic, start = key.split('/')
+        df, column = rollup_stores[granularity].get_day(start), f'{field} ({statistic})'
+    if resolution:
+        df = aggregate_to_resolution(df, int(resolution))
+    return {'colors': generate_hex_colors(df, field, column=column)}
+
+
+def cell_values(day, cell) -> pd.DataFrame:
+    """
+    Model output of one hexagon of the pyramid on one day: the grid cell's row, the row of the grid parent of a finer
+    cell, or the aggregate of the children of a coarser one
+    """
+    resolution = h3.get_resolution(cell)
+    if resolution >= GRID_RESOLUTION:
+        return store.get_cell(day, color_key(cell))
+    aggregated = aggregate_to_resolution(store.get_day(day), resolution)
+    return aggregated[aggregated['Hexagon_ID'] == h3.str_to_int(cell)]
+
+
+def cell_history(cell, columns) -> pd.DataFrame:
+    """
+    Every day of one hexagon of the pyramid, coarser cells average the histories of their children in the grid
+    """
+    if h3.get_resolution(cell) >= GRID_RESOLUTION:
+        return hex_history.get_history([color_key(cell)], columns=columns)
+    children = [child for child in h3.cell_to_children(cell, GRID_RESOLUTION) if child in grid_cells()]
+    history = hex_history.get_history(children, columns=columns)
+    return history.groupby('date', as_index=False, sort=True).agg(parent_aggregations(columns))
+
+
+# The hex layer is drawn from pre-colored PNG tiles by default, HEX_LAYER=geojson draws it as GeoJSON polygons
+hex_layer_mode = os.getenv('HEX_LAYER', 'tiles')
+# Rendered tiles are written once to a directory shared by every worker and cached by browsers for TILE_MAX_AGE.
+# Both are keyed by the deploy version, so a redeploy neither serves nor lets browsers reuse tiles of older output
+tile_cache = TileCache(os.getenv('TILE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'wildfire-tiles')),
+                       version=deploy_version)
+tile_max_age = int(os.getenv('TILE_MAX_AGE', 24 * 60 * 60))
+
+
+def tile_url(date_str, active_name=None, granularity='day', statistic='mean'):
+    """
+    URL template of the hex layer tiles of a date or period and field, the map fills in {z}/{x}/{y}
+    """
+    display_name = get_field_identifier(active_name).replace('Normalized ', '')
+    query = {'v': deploy_version}
+    if granularity in rollup_stores:
+        # Every day of a period shares the URL of its first day, so browsers cache the period's tiles once
+        date_str = rollup_stores[granularity].period_start(date_str).isoformat()
+        query.update(granularity=granularity, statistic=statistic)
+    return f'/tiles/{quote(display_name)}/{date_str}/{{z}}/{{x}}/{{y}}.png?{urlencode(query)}'
+
+
+@lru_cache(maxsize=None)
+def render_colorbar(field):
+    return generate_colorbar(field, n_ticks=11)
+
+
+# Renders the most requested dates ahead of time, skipping days and rollups that are no longer deployed
+layer_cache.warm([key for key in layer_cache.most_requested_dates(int(os.getenv('LAYER_CACHE_WARM', 0)))
+                  if is_deployed_layer(key)], field_identifiers, render_hex_colors)
 
 # hex_ids = data['Hexagon_ID'].unique().tolist()  # TODO DON'T THINK THIS IS NEEDED ANYMORE
 
@@ -65,6 +214,44 @@ app = dash.Dash(
 )
 server = app.server
 
+
+@server.route('/cache/stats')
+def cache_stats():
+    """
+    Hit/miss counters of the layer and colorbar caches of this worker
+    """
+    colorbar = render_colorbar.cache_info()
+    return jsonify(layers=layer_cache.stats(), colorbar={'hits': colorbar.hits, 'misses': colorbar.misses})
+
+
+@server.route('/tiles/<field>/<date_str>/<int:z>/<int:x>/<int:y>.png')
+def hex_tile(field, date_str, z, x, y):
+    """
+    Pre-colored PNG tile of the hex layer of a field on a day, or on the week, month or season holding it with the
+    granularity and statistic query parameters. Each tile is rendered once into the shared tile cache, the v query
+    parameter only tells browsers' caches deploys apart
+    """
+    field = get_field_identifier(field)
+    granularity = request.args.get('granularity', 'day')
+    statistic = request.args.get('statistic', 'mean')
+    try:
+        day = date.fromisoformat(date_str)
+    except ValueError:
+        abort(404)
+    # fromisoformat also accepts e.g. 20200101, which must share the cache entry of 2020-01-01
+    date_str = day.isoformat()
+    # The first period of a rollup can start before the first deployed day
+    first_day = rollup_stores[granularity].period_start(min_date) if granularity in rollup_stores else min_date
+    if not first_day <= day <= max_date or field not in field_identifiers or statistic not in rollup_statistics \
+            or not 0 <= z <= MAX_TILE_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        abort(404)
+
+    key = layer_key(date_str, granularity, statistic, resolution_for_zoom(z))
+    path = tile_cache.get_or_render(field, layer_key(date_str, granularity, statistic), z, x, y,
+                                    lambda: render_tile(layer_colors(key, field, count=False), z, x, y))
+    return send_file(path, mimetype='image/png', max_age=tile_max_age, conditional=True)
+
+
 app.layout = html.Div([
     html.H2("Wildfire Dashboard", style={'textAlign': 'center'}),
     dcc.Tabs(
@@ -105,12 +292,22 @@ def render_tab_content(tab):
                     html.H3(""),
                     dl.Map(children=[
                         dl.TileLayer(),
-                        dl.LayersControl(id="lc", collapsed=False, position="bottomright", children=[
-                        ])
+                        dl.TileLayer(id='hex-tiles', url=tile_url(default_date.isoformat()),
+                                     maxNativeZoom=MAX_TILE_ZOOM)
+                        if hex_layer_mode == 'tiles' else generate_hex_layer(generate_hex_geojson(GRID_RESOLUTION)),
+                        dl.LayersControl(id="lc", collapsed=False, position="bottomright",
+                                         children=generate_layers())
                     ], center=[40, -95], zoom=4, style={'height': '50vh'}, id="map"),
+                    # Resolution, bounds and layer of the hexagons the GeoJSON hex layer currently draws, and the
+                    # changes sent to draw the next ones
+                    dcc.Store(id='hex-view', data={'resolution': GRID_RESOLUTION, 'bounds': None, 'layer': None}),
+                    dcc.Store(id='hex-delta'),
 
                     html.Div(id="colorbar", style={"height": "30px", "margin": "20px 20px"}),
                     html.Button("Recenter", id="recenter", style = {'marginTop': '15px'}),
+                    # Full history of the clicked hexagon
+                    dcc.Graph(id='hex-history', config={'displayModeBar': False}, style={'height': '35vh'},
+                              figure=render_hex_history(None, None, None)),
                 ], style={'width': '75%', 'display': 'inline-block', 'verticalAlign': 'top', 'padding': '20px'}),
                 html.Div([
                     html.H3("Model"),
@@ -130,10 +327,31 @@ def render_tab_content(tab):
                     min=0,
                     max=len(date_range) - 1,
                     step=1,
-                    value=date_to_index[date(2020, 1, 1)],
+                    value=date_to_index[default_date],
                     marks=date_marks,
                     tooltip={"always_visible": False, "transform": "numberToDate"},
                 ),
+                # Shows the day or an aggregate of the week, month or season holding it
+                html.Div([
+                    dcc.RadioItems(
+                        id='time-resolution',
+                        options=[{'label': 'Day', 'value': 'day'}] +
+                                [{'label': granularity.capitalize(), 'value': granularity}
+                                 for granularity in rollup_stores],
+                        value='day',
+                        inline=True,
+                        inputStyle={'marginRight': '5px', 'marginLeft': '15px'}
+                    ),
+                    dcc.RadioItems(
+                        id='rollup-statistic',
+                        options=[{'label': 'Mean', 'value': 'mean'}, {'label': 'Max', 'value': 'max'},
+                                 {'label': '90th percentile', 'value': 'p90'}],
+                        value='mean',
+                        inline=True,
+                        inputStyle={'marginRight': '5px', 'marginLeft': '15px'},
+                        style={'display': 'inline-block' if rollup_stores else 'none', 'marginLeft': '30px'}
+                    ),
+                ], style={'display': 'flex', 'marginTop': '10px'}),
             ], style={'padding': '10px', 'marginBottom': '20px'})
         ])
 
@@ -159,9 +377,12 @@ def render_tab_content(tab):
 # Updates the label of the selected date
 @app.callback(
     Output('selected-date-label', 'children'),
-    Input('date-slider', 'value')
+    Input('date-slider', 'value'),
+    Input('time-resolution', 'value')
 )
-def update_date_label(date_index):
+def update_date_label(date_index, granularity):
+    if granularity in rollup_stores:
+        return period_label(rollup_stores[granularity].period_start(available_dates[date_index]), granularity)
     return available_dates[date_index].strftime('%Y-%m-%d')
 
 
@@ -178,60 +399,91 @@ def recenter(_):
     return dict(center=[40, -95], zoom=4, transition="flyTo")
 
 
-@app.callback(
-    Output('lc', 'children'),
-    Output("lc", "baseLayer"),
-    Input('date-slider', 'value'),
-    State("lc", "baseLayer")
-)
-def update_layers_on_date(date_index, active_name):
+def update_tiles_on_date(date_index, active_name, granularity, statistic):
+    """
+    Points the hex tile layer at the tiles of the selected date or period and field. The layer's colors are
+    rendered here, counting the request, so the map's tile requests only draw them
+    """
     if date_index is None:
-        return [], None
+        return dash.no_update
 
-    selected_date = available_dates[date_index]
-    subset = data[
-        (data['year'] == selected_date.year) &
-        (data['month'] == selected_date.month) &
-        (data['day'] == selected_date.day)
-        ]
+    date_str = available_dates[date_index].strftime('%Y-%m-%d')
+    layer_colors(layer_key(date_str, granularity, statistic), get_field_identifier(active_name))
+    return tile_url(date_str, active_name, granularity, statistic)
 
-    layers = generate_layers(subset, selected_date.strftime('%Y-%m-%d'), active_name)
-    return layers, active_name
 
-
-@app.callback(
-    Output("lc", "baseLayer", allow_duplicate=True),
-    Input("lc", "baseLayer"),
-    prevent_initial_call=True
-)
-def persist_base_layer_selection(active_name):
-    return active_name
+def update_layers_on_date(date_index, active_name, granularity, statistic, zoom, bounds, view):
+    """
+    Sends the changes that draw the hex layer for the selected date or period and field within the map viewport,
+    at the resolution of the pyramid matching the zoom. Panning only sends the hexagons entering the viewport with
+    their colors and the ids of the ones leaving it, a new date or field only sends the colors of the visible
+    hexagons. The geometry is resent when the resolution changes. assets/hex_layer.js applies the changes
+    """
+    if date_index is None:
+        return dash.no_update, dash.no_update
+
+    resolution = resolution_for_zoom(zoom)
+    cells = viewport_cells(resolution, bounds)
+    reset = not view or view['resolution'] != resolution
+    drawn = set() if reset else set(viewport_cells(view['resolution'], view['bounds']))
+    added = [cell for cell in cells if cell not in drawn]
+    removed = sorted(drawn.difference(cells))
+
+    key = layer_key(available_dates[date_index].strftime('%Y-%m-%d'), granularity, statistic, resolution)
+    field = get_field_identifier(active_name)
+    restyle = reset or view['layer'] != [key, field]
+    if not restyle and not added and not removed:
+        return dash.no_update, dash.no_update
+
+    # Panning is not a request for the layer, only new dates and fields count towards the most requested ones
+    colors = layer_colors(key, field, count=restyle)
+    keys = {color_key(cell) for cell in (cells if restyle else added)}
+    delta = {
+        'reset': reset,
+        'add': generate_hex_features(added),
+        'remove': removed,
+        'restyle': restyle,
+        'colors': {hex_key: colors[hex_key] for hex_key in keys if hex_key in colors},
+    }
+    return delta, {'resolution': resolution, 'bounds': bounds, 'layer': [key, field]}
+
+
+layer_inputs = [Input('date-slider', 'value'), Input('lc', 'baseLayer'), Input('time-resolution', 'value'),
+                Input('rollup-statistic', 'value')]
+if hex_layer_mode == 'tiles':
+    app.callback(Output('hex-tiles', 'url'), *layer_inputs)(update_tiles_on_date)
+else:
+    app.callback(Output('hex-delta', 'data'), Output('hex-view', 'data'), *layer_inputs, Input('map', 'zoom'),
+                 Input('map', 'bounds'), State('hex-view', 'data'))(update_layers_on_date)
+    app.clientside_callback(
+        ClientsideFunction(namespace='hexLayer', function_name='applyDelta'),
+        Output('hex-layer', 'data'),
+        Output('hex-layer', 'hideout'),
+        Input('hex-delta', 'data'),
+        State('hex-layer', 'data'),
+        State('hex-layer', 'hideout'),
+        prevent_initial_call=True
+    )
 
 
 @app.callback(
     Output('output-container', 'children'),
     Input('map', 'clickData'),
     Input('date-slider', 'value'),
+    State('map', 'zoom'),
 )
-def show_click_data(clickData, date_index):
+def show_click_data(clickData, date_index, zoom):
     if not clickData or date_index is None:
         readable_date = available_dates[date_index].strftime('%Y-%m-%d')
         return f"Click on a hexagon to view model predictions for {readable_date}."
 
     lat = clickData['latlng']['lat']
     lon = clickData['latlng']['lng']
-    cell = latlng_to_cell(lat, lon, CELL_RESOLUTION)
+    # The clicked hexagon is the one drawn at the displayed resolution
+    cell = latlng_to_cell(lat, lon, resolution_for_zoom(zoom))
 
     selected_date = available_dates[date_index]
-    year, month, day = selected_date.year, selected_date.month, selected_date.day
-
-    # year, month, day = map(int, date_str.split('-'))
-    filtered = data[
-        (data['year'] == year) &
-        (data['month'] == month) &
-        (data['day'] == day) &
-        (data['Hexagon_ID'] == cell)
-        ]
+    filtered = cell_values(selected_date, cell)
 
     columns_to_keep = [
         'Predicted Fire Probability',
@@ -241,8 +493,7 @@ def show_click_data(clickData, date_index):
         'Snowfall (3-Day Average)',
         'Daily Average Wind (3-Day Average)',
         'Average Elevation',
-        'Fire Occurred?',
-        'geometry'
+        'Fire Occurred?'
     ]
 
     filtered = filtered[columns_to_keep]
@@ -261,7 +512,7 @@ def show_click_data(clickData, date_index):
 
     filtered = filtered.round(5)
 
-    transposed = filtered.drop(columns='geometry').T
+    transposed = filtered.T
     transposed.columns = ['Value']
     transposed.reset_index(inplace=True)
     transposed.columns = ['Variable', 'Value']
@@ -288,6 +539,97 @@ def show_click_data(clickData, date_index):
 ])
 
 
+# Plotly figures are built as dicts, validating a go.Figure costs more than reading the hexagon's history
+history_template = pio.templates['plotly_dark'].to_plotly_json()
+
+
+def history_marker(selected_date) -> list[dict]:
+    """
+    Shapes of the history chart marking the date selected on the slider
+    """
+    return [{'type': 'line', 'xref': 'x', 'yref': 'paper', 'x0': selected_date.isoformat(),
+             'x1': selected_date.isoformat(), 'y0': 0, 'y1': 1, 'line': {'color': 'white', 'width': 1, 'dash': 'dot'}}]
+
+
+def render_hex_history(cell, field, selected_date) -> dict:
+    """
+    Chart of the predicted fire probability of one hexagon over every deployed day, with the days a fire occurred
+    marked, and below it the field shown on the map when it is not the probability
+    :param cell: H3 cell id, None before a hexagon is clicked
+    :param field: field identifier of the map layer
+    :param selected_date: date marked on the chart
+    """
+    value_field = field if field and field != field_identifiers[0] else None
+    layout = {'template': history_template, 'margin': dict(l=50, r=20, t=30, b=30), 'showlegend': False,
+              'paper_bgcolor': 'rgba(0,0,0,0)', 'xaxis': {'type': 'date'},
+              'yaxis': {'title': {'text': 'Fire Probability'}, 'domain': [0.55, 1] if value_field else [0, 1]}}
+    if cell is None:
+        layout['title'] = {'text': 'Click on a hexagon to view its history', 'font': {'size': 14}}
+        return {'data': [], 'layout': layout}
+
+    columns = ['Predicted Fire Probability', 'Fire Occurred?']
+    if value_field:
+        columns.append(value_field.replace('Normalized ', ''))
+    history = cell_history(cell, columns)
+    dates = history['date'].dt.strftime('%Y-%m-%d').tolist()
+    probability = history['Predicted Fire Probability'].to_numpy()
+    fires = history['Fire Occurred?'].to_numpy() == 1
+
+    data = [
+        {'type': 'scattergl', 'x': dates, 'y': probability, 'mode': 'lines', 'name': 'Fire Probability',
+         'line': {'color': '#f0ad4e', 'width': 1}},
+        {'type': 'scattergl', 'x': [d for d, fire in zip(dates, fires) if fire], 'y': probability[fires],
+         'mode': 'markers', 'name': 'Fire Occurred', 'marker': {'color': '#d9534f', 'size': 6}},
+    ]
+    if value_field:
+        values, unit = convert_field_values(history[columns[-1]], value_field)
+        data.append({'type': 'scattergl', 'x': dates, 'y': values, 'mode': 'lines', 'xaxis': 'x2', 'yaxis': 'y2',
+                     'name': get_display_name(value_field), 'line': {'color': '#5bc0de', 'width': 1}})
+        layout['xaxis2'] = {'type': 'date', 'matches': 'x', 'anchor': 'y2'}
+        layout['xaxis']['showticklabels'] = False
+        layout['yaxis2'] = {'title': {'text': f'{get_display_name(value_field)} ({unit})'}, 'domain': [0, 0.45],
+                            'anchor': 'x2'}
+    if selected_date is not None:
+        layout['shapes'] = history_marker(selected_date)
+    layout['title'] = {'text': f'History of hexagon {cell}', 'font': {'size': 14}}
+    return {'data': data, 'layout': layout}
+
+
+@app.callback(
+    Output('hex-history', 'figure'),
+    Input('map', 'clickData'),
+    Input('lc', 'baseLayer'),
+    State('date-slider', 'value'),
+    State('map', 'zoom'),
+    prevent_initial_call=True
+)
+def show_hex_history(clickData, active_name, date_index, zoom):
+    """
+    Charts the whole series of the clicked hexagon, a contiguous slice of the hex-major history file per grid cell
+    """
+    cell = latlng_to_cell(clickData['latlng']['lat'], clickData['latlng']['lng'], resolution_for_zoom(zoom)) \
+        if clickData else None
+    selected_date = available_dates[date_index] if date_index is not None else None
+    return render_hex_history(cell, get_field_identifier(active_name), selected_date)
+
+
+@app.callback(
+    Output('hex-history', 'figure', allow_duplicate=True),
+    Input('date-slider', 'value'),
+    State('map', 'clickData'),
+    prevent_initial_call=True
+)
+def move_history_marker(date_index, clickData):
+    """
+    Moves the date marker of the history chart with the slider, the series itself is not read or sent again
+    """
+    if not clickData or date_index is None:
+        return dash.no_update
+    figure = dash.Patch()
+    figure['layout']['shapes'] = history_marker(available_dates[date_index])
+    return figure
+
+
 @app.callback(
     Output("colorbar", "children"),
     Input("lc", "baseLayer"),
@@ -300,7 +642,7 @@ def update_colorbar(base, overlays):
         base = "Predicted Fire Probability"
 
         # Have to re-add the word Normalized so it works within the _viz_helpers.py framework
-    return generate_colorbar("Normalized " + base, n_ticks=11)
+    return render_colorbar("Normalized " + base)
 
 # Logic to copy to clipboard - Javascript
 app.clientside_callback(
@@ -0,0 +1,16 @@
+import argparse
+
+from ..datalake import Datalake
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the hexagon x day feature table, only computing new or '
+                                                 'changed days')
+    parser.add_argument('--root', default='../../data', help='datalake root')
+    parser.add_argument('--start', help='first day to build, YYYY-MM-DD')
+    parser.add_argument('--end', help='last day to build, YYYY-MM-DD')
+    parser.add_argument('--force', action='store_true', help='rebuild every day even if it is up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only list the days that would be rebuilt')
+    args = parser.parse_args()
+
+    lake = Datalake(args.root)
+    lake.process_features(start=args.start, end=args.end, force=args.force, dry_run=args.dry_run)
@@ -1,7 +1,20 @@
+import argparse
+import os
+
 from ..datalake import Datalake
 
 if __name__ == '__main__':
-    lake = Datalake('../../data')
-    # lake.download_ghcnd()
-    lake.process_ghcnd_stations()
-    lake.process_ghcnd_daily()
+    parser = argparse.ArgumentParser(description='Download and clean GHCN-D, only rebuilding what changed')
+    parser.add_argument('--root', default='../../data', help='datalake root')
+    parser.add_argument('--download', action='store_true', help='download sources that changed upstream first')
+    parser.add_argument('--force', action='store_true', help='rebuild everything even if it is up to date')
+    parser.add_argument('--download-workers', type=int, default=4, help='files downloaded at the same time')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be downloaded or rebuilt')
+    args = parser.parse_args()
+
+    lake = Datalake(args.root)
+    if args.download:
+        lake.download_ghcnd(force=args.force, dry_run=args.dry_run, workers=args.download_workers)
+    lake.process_ghcnd_stations(force=args.force, dry_run=args.dry_run)
+    lake.process_ghcnd_daily(stream=True, workers=os.cpu_count(), force=args.force, dry_run=args.dry_run)
+    lake.process_ghcnd_curated(force=args.force, dry_run=args.dry_run)
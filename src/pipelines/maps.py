@@ -1,5 +1,13 @@
+import argparse
+
 from ..datalake import Datalake
 
 if __name__ == "__main__":
-    data = Datalake('../../data')
-    data.process_states()
+    parser = argparse.ArgumentParser(description='Clean the US states map, only rebuilding it if it changed')
+    parser.add_argument('--root', default='../../data', help='datalake root')
+    parser.add_argument('--force', action='store_true', help='rebuild even if it is up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be rebuilt')
+    args = parser.parse_args()
+
+    data = Datalake(args.root)
+    data.process_states(force=args.force, dry_run=args.dry_run)
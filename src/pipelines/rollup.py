@@ -0,0 +1,20 @@
+import argparse
+
+from ..datalake import Datalake
+from ..datalake.rollup import granularities
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate the daily model outputs per week, month and season, only '
+                                                 'rebuilding periods whose days changed')
+    parser.add_argument('--root', default='../../data', help='datalake root, holds the build manifest')
+    parser.add_argument('--output', default='../assets', help='directory holding the Model_Output_YYYY-MM-DD.parquet '
+                                                               'files, rollups are written to its rollups/ directory')
+    parser.add_argument('--granularity', choices=granularities, action='append',
+                        help='period to aggregate to, can be repeated, all of them by default')
+    parser.add_argument('--force', action='store_true', help='rebuild every period even if it is up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only list the periods that would be rebuilt')
+    args = parser.parse_args()
+
+    lake = Datalake(args.root)
+    lake.process_rollups(args.output, granularities=args.granularity or granularities, force=args.force,
+                         dry_run=args.dry_run)
@@ -0,0 +1,22 @@
+import argparse
+
+from ..datalake import Datalake
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score the feature table with the fire model and write the daily '
+                                                 'model outputs the dashboard reads, only scoring new or changed days')
+    parser.add_argument('--root', default='../../data', help='datalake root')
+    parser.add_argument('--model', required=True, help='joblib file of the fitted random forest')
+    parser.add_argument('--output', default='../assets', help='directory the Model_Output_YYYY-MM-DD.parquet files '
+                                                               'are written to')
+    parser.add_argument('--start', help='first day to score, YYYY-MM-DD')
+    parser.add_argument('--end', help='last day to score, YYYY-MM-DD')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='cores used for scoring, -1 uses all of them')
+    parser.add_argument('--force', action='store_true', help='rescore every day even if it is up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only list the days that would be scored')
+    args = parser.parse_args()
+
+    lake = Datalake(args.root)
+    lake.process_hex_geometry(force=args.force, dry_run=args.dry_run)
+    lake.process_model_output(args.model, args.output, start=args.start, end=args.end, n_jobs=args.n_jobs,
+                              force=args.force, dry_run=args.dry_run)
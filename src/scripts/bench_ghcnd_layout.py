@@ -0,0 +1,69 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pyarrow.compute as pc
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from datalake import Datalake
+
+# Compares Datalake.query_ghcnd on the flat one-file-per-year clean layout with the curated year/month layout
+# (build it first with Datalake.process_ghcnd_curated). Bytes read come from /proc/self/io, so this only runs on Linux.
+
+
+def bytes_read() -> int:
+    with open('/proc/self/io') as f:
+        return int(next(line for line in f if line.startswith('rchar:')).split()[1])
+
+
+def layout_size(path) -> int:
+    return sum(file.stat().st_size for file in Path(path).rglob('*.parquet'))
+
+
+def run(lake, query, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start_bytes = bytes_read()
+        start = time.perf_counter()
+        rows = len(lake.query_ghcnd(query))
+        seconds.append(time.perf_counter() - start)
+        read = bytes_read() - start_bytes
+    return rows, min(seconds), read
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark GHCN-D queries on the flat and curated daily layouts')
+    parser.add_argument('--root', default='../../data', help='datalake root')
+    parser.add_argument('--year', type=int, default=2020, help='year used by the single year/day/hexagon queries')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per query, the fastest is reported')
+    args = parser.parse_args()
+
+    curated = Datalake(args.root)
+    flat = Datalake(args.root)
+    # query_ghcnd falls back to the clean files when the curated layout does not exist
+    flat.paths["ghcnd_curated_daily"] = 'missing/'
+
+    print(f'clean layout:   {layout_size(curated.datalake_root / curated.paths["ghcnd_clean_daily"]) / 1e6:.1f} MB')
+    print(f'curated layout: {layout_size(curated.datalake_root / curated.paths["ghcnd_curated_daily"]) / 1e6:.1f} MB '
+          f'+ stations {layout_size(curated.datalake_root / curated.paths["ghcnd_curated_stations"]) / 1e6:.1f} MB')
+
+    sample = curated.query_ghcnd((pc.field('year') == args.year) & (pc.field('month') == 1) & (pc.field('day') == 1))
+    hex_id = sample['Hexagon_ID'].mode().iloc[0]
+    queries = {
+        'one year': pc.field('year').isin([args.year]),
+        'one month': (pc.field('year') == args.year) & (pc.field('month') == 7),
+        'one day': (pc.field('year') == args.year) & (pc.field('month') == 7) & (pc.field('day') == 1),
+        'one hexagon': pc.field('Hexagon_ID') == hex_id,
+        'one hexagon, one year': (pc.field('Hexagon_ID') == hex_id) & (pc.field('year') == args.year),
+        'one state': pc.field('state') == 'CA',
+    }
+
+    print(f'{"query":<24}{"rows":>10}{"flat s":>10}{"curated s":>11}{"flat MB":>10}{"curated MB":>12}')
+    for name, query in queries.items():
+        rows, flat_seconds, flat_bytes = run(flat, query, args.repeat)
+        curated_rows, curated_seconds, curated_bytes = run(curated, query, args.repeat)
+        assert rows == curated_rows, f'{name}: {rows} rows on the flat layout but {curated_rows} curated'
+        print(f'{name:<24}{rows:>10,}{flat_seconds:>10.3f}{curated_seconds:>11.3f}'
+              f'{flat_bytes / 1e6:>10.1f}{curated_bytes / 1e6:>12.1f}')
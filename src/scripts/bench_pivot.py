@@ -0,0 +1,41 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from datalake import Datalake
+
+# Compares the outer-merge chain (create_element_tables + join_element_tables) with Datalake.pivot_elements
+# on one year of raw GHCN-D daily data and checks both produce the same table.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the GHCN-D long to wide element pivot')
+    parser.add_argument('raw_path', help='raw daily file, e.g. data/raw/ghcnd/daily/2024.csv.gz')
+    args = parser.parse_args()
+
+    lake = Datalake(Path(args.raw_path).parent)
+    df = pd.read_csv(args.raw_path, header=None,
+                     names=['station_id', 'date', 'element', 'value', 'm_flag', 'q_flag', 's_flag', 'time'],
+                     dtype={'station_id': 'str', 'element': pd.CategoricalDtype(), 'm_flag': pd.CategoricalDtype(),
+                            'q_flag': pd.CategoricalDtype(), 's_flag': pd.CategoricalDtype(), 'date': str,
+                            'time': str, 'value': 'float'},
+                     engine='pyarrow')
+    df = lake.drop_daily_columns(lake.process_dates(df))
+    print(f'{len(df):,} observations')
+
+    start = time.perf_counter()
+    merged = lake.join_element_tables(lake.create_element_tables(df))
+    merge_seconds = time.perf_counter() - start
+    print(f'merge chain: {merge_seconds:.2f}s')
+
+    start = time.perf_counter()
+    pivoted = lake.pivot_elements(df)
+    pivot_seconds = time.perf_counter() - start
+    print(f'single pass pivot: {pivot_seconds:.2f}s ({merge_seconds / pivot_seconds:.1f}x faster)')
+
+    pd.testing.assert_frame_equal(merged, pivoted)
+    print('outputs are identical')
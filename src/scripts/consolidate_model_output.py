@@ -0,0 +1,22 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.store import ModelOutputStore, consolidate_hex_history, consolidate_model_output
+
+# Consolidates the Model_Output_YYYY-MM-DD.parquet files into a single Arrow IPC file.
+# Point MODEL_OUTPUT_ARROW at the output so every gunicorn worker memory-maps the same copy.
+# --hex-history also writes the hex-major copy the history chart reads, point HEX_HISTORY_ARROW at it. The dashboard
+# never builds it, rerun this after deploying new days. Without a destination only the history is written.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consolidate model output partitions into one Arrow IPC file')
+    parser.add_argument('source', help='directory holding the Model_Output_YYYY-MM-DD.parquet files')
+    parser.add_argument('destination', nargs='?', help='Arrow IPC file to write, e.g. assets/model_output.arrow')
+    parser.add_argument('--hex-history', help='hex-major Arrow IPC file to write, e.g. assets/hex_history.arrow')
+    args = parser.parse_args()
+    if args.destination:
+        consolidate_model_output(args.source, args.destination)
+    if args.hex_history:
+        consolidate_hex_history(ModelOutputStore(args.source, cache_size=1), args.hex_history)
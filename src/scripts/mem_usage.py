@@ -1,25 +1,79 @@
-import os
-import pandas as pd
+import argparse
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
-def get_memory_usage(directory):
-    total_memory_usage = 0
+sys.path.append(str(Path(__file__).parent.parent))
+
+from datalake import Datalake
+from datalake.schema import compact_ghcnd, compact_model_output, hexagon_strings
+
+# Reports the in-memory pandas footprint of each table before and after the compact schema in datalake/schema.py.
+# "Before" widens every column back to the types the tables used to be written with: string H3 and station ids,
+# float64 values and timestamps, so files written with either schema can be compared.
+# Before the compact schema the model output directory took 0.45 GB once loaded.
+
+
+def widen(table) -> pa.Table:
+    """
+    Casts a table back to the wide types: dictionaries to strings, uint64 H3 cells to strings, numbers to
+    float64 or int32 and dates to timestamps, adding year/month/day next to a date like the old model outputs
+    """
+    for i, field in enumerate(table.schema):
+        column = table[field.name]
+        if pa.types.is_dictionary(field.type):
+            column = column.cast(field.type.value_type)
+        elif field.type == pa.uint64():
+            column = pa.array(hexagon_strings(column.to_numpy()), type=pa.string())
+        elif field.name in ('year', 'month', 'day') and pa.types.is_integer(field.type):
+            column = column.cast(pa.int32())
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            column = column.cast(pa.float64())
+        elif pa.types.is_date(field.type):
+            column = column.cast(pa.timestamp('ns'))
+        table = table.set_column(i, field.name, column)
+    if 'date' in table.column_names and 'year' not in table.column_names:
+        for name, part in (('year', pc.year), ('month', pc.month), ('day', pc.day)):
+            table = table.append_column(name, part(table['date']).cast(pa.int32()))
+    return table
+
+
+def footprint(paths, compact) -> tuple[int, float, float]:
+    """
+    Rows and pandas memory in GB of a set of files in the wide and the compact schema
+    """
+    rows, before, after = 0, 0, 0
+    for path in paths:
+        table = pq.read_table(path)
+        rows += len(table)
+        before += widen(table).to_pandas().memory_usage(deep=True).sum() / 10 ** 9
+        after += compact(table).to_pandas(date_as_object=False).memory_usage(deep=True).sum() / 10 ** 9
+    return rows, before, after
 
-    for filename in os.listdir(directory):
-        if filename.endswith(".parquet"):
-            file_path = os.path.join(directory, filename)
-            df = pq.read_table(file_path).to_pandas()
-            memory_usage = df.memory_usage(deep=True).sum()/10**9
-            print(memory_usage)
-            total_memory_usage += memory_usage
-            print(total_memory_usage)
 
-    return total_memory_usage
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the memory of each table before and after the compact '
+                                                 'schema')
+    parser.add_argument('--model-output', help='directory holding the Model_Output_YYYY-MM-DD.parquet files')
+    parser.add_argument('--root', help='datalake root, reports the clean and curated GHCN-D daily tables')
+    args = parser.parse_args()
 
-# Example usage
-directory_path = input('enter path to dataset directory')
-total_memory = get_memory_usage(directory_path)
-print(f"Total memory usage: {total_memory} gb")
+    tables = {}
+    if args.model_output:
+        tables['model output'] = (sorted(Path(args.model_output).glob('Model_Output_*.parquet')),
+                                  compact_model_output)
+    if args.root:
+        lake = Datalake(args.root)
+        tables['clean daily'] = (sorted((lake.datalake_root / lake.paths["ghcnd_clean_daily"]).glob('*.parquet')),
+                                 compact_ghcnd)
+        tables['curated daily'] = (sorted((lake.datalake_root / lake.paths["ghcnd_curated_daily"]).rglob('*.parquet')),
+                                   compact_ghcnd)
 
-## OUTPUT:
-# Total memory usage: 0.4524759160000015 gb
+    print(f'{"table":<16}{"files":>7}{"rows":>14}{"before GB":>12}{"after GB":>12}{"saved":>8}')
+    for name, (paths, compact) in tables.items():
+        rows, before, after = footprint(paths, compact)
+        saved = 1 - after / before if before else 0
+        print(f'{name:<16}{len(paths):>7}{rows:>14,}{before:>12.4f}{after:>12.4f}{saved:>8.0%}')
@@ -0,0 +1,42 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Renders the hex layer tiles of popular dates into the tile cache ahead of time. Tiles are requested through the
+# dashboard's own /tiles endpoint, so run it with the same ASSETS_ROOT, TILE_CACHE_PATH and LAYER_CACHE_PATH as the
+# dashboard. --top picks the most requested dates from the shared layer cache, --date adds dates of its own.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render hex layer tiles of popular dates into the tile cache')
+    parser.add_argument('--date', action='append', default=[], help='YYYY-MM-DD date to render, can be repeated')
+    parser.add_argument('--top', type=int, default=0, help='also render the n most requested dates of the layer cache')
+    parser.add_argument('--field', action='append', help='layer name to render, e.g. "Predicted Fire Probability", '
+                                                          'every field when not given')
+    parser.add_argument('--granularity', default='day', help='day, or the week, month or season rollup')
+    parser.add_argument('--statistic', default='mean', help='rollup statistic: mean, max or p90')
+    parser.add_argument('--min-zoom', type=int, default=3)
+    parser.add_argument('--max-zoom', type=int, default=7)
+    args = parser.parse_args()
+
+    import main
+    from app import covering_tiles
+
+    # Rollup keys of the layer cache are rendered through the date their period starts on, keys of days or periods
+    # that are no longer deployed are skipped
+    dates = args.date + [key.split('/')[-1].split('@')[0]
+                         for key in main.layer_cache.most_requested_dates(args.top) if main.is_deployed_layer(key)]
+    fields = args.field or [field.replace('Normalized ', '') for field in main.field_identifiers]
+    tiles = [(z, x, y) for z in range(args.min_zoom, args.max_zoom + 1) for x, y in covering_tiles(z)]
+    client = main.server.test_client()
+
+    for date_str in dict.fromkeys(dates):
+        for field in fields:
+            start = time.perf_counter()
+            url = main.tile_url(date_str, field, args.granularity, args.statistic)
+            for z, x, y in tiles:
+                response = client.get(url.format(z=z, x=x, y=y))
+                if response.status_code != 200:
+                    sys.exit(f'{response.status_code} for {url.format(z=z, x=x, y=y)}')
+            print(f'SEEDED: {date_str} {field} {len(tiles)} tiles in {time.perf_counter() - start:.1f} s')
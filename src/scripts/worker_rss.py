@@ -0,0 +1,87 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+# Starts the dashboard under gunicorn with 1, 4 and 16 workers and reports the memory of each worker.
+# RSS counts shared pages in every process that maps them, PSS splits shared pages between processes,
+# so with a memory-mapped dataset or --preload the PSS column is the one that shows the saving.
+# Linux only, it reads /proc.
+
+SRC_ROOT = Path(__file__).parent.parent
+
+
+def read_memory_kib(pid):
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key] = int(value.split()[0])
+    return memory
+
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def wait_until_ready(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=5).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f'{url} did not respond within {timeout}s')
+
+
+def measure(workers, port, preload, env, timeout):
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'main:server']
+    if preload:
+        command.insert(3, '--preload')
+    server = subprocess.Popen(command, cwd=SRC_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(f'http://127.0.0.1:{port}/_dash-layout', timeout)
+        # Wait for every worker to finish booting, each one loads main.py unless --preload is set
+        while len(child_pids(server.pid)) < workers:
+            time.sleep(0.5)
+        time.sleep(2)
+        return read_memory_kib(server.pid), [read_memory_kib(pid) for pid in child_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report per-worker RSS/PSS of the dashboard under gunicorn')
+    parser.add_argument('--assets-root', default=os.getenv('ASSETS_ROOT', 'assets'))
+    parser.add_argument('--arrow', default=None, help='consolidated Arrow file to memory-map (MODEL_OUTPUT_ARROW)')
+    parser.add_argument('--preload', action='store_true', help='load the app in the gunicorn master')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--port', type=int, default=18050)
+    parser.add_argument('--timeout', type=int, default=300)
+    args = parser.parse_args()
+
+    env = dict(os.environ, ASSETS_ROOT=str(Path(args.assets_root).resolve()))
+    if args.arrow:
+        env['MODEL_OUTPUT_ARROW'] = str(Path(args.arrow).resolve())
+
+    print(f"{'workers':>7} {'master rss':>12} {'worker rss':>12} {'worker pss':>12} {'total pss':>12}")
+    for workers in args.workers:
+        master, worker_memory = measure(workers, args.port, args.preload, env, args.timeout)
+        worker_rss = sum(m['Rss'] for m in worker_memory) / len(worker_memory) / 1024
+        worker_pss = sum(m['Pss'] for m in worker_memory) / len(worker_memory) / 1024
+        total_pss = (master['Pss'] + sum(m['Pss'] for m in worker_memory)) / 1024
+        print(f"{workers:>7} {master['Rss'] / 1024:>10.1f}MB {worker_rss:>10.1f}MB {worker_pss:>10.1f}MB "
+              f"{total_pss:>10.1f}MB")
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import h3
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from datalake.rollup import rollup_values
+from datalake.schema import compact_model_output
+
+MODEL_OUTPUT_CELLS = sorted(h3.grid_disk(h3.latlng_to_cell(40.0, -105.0, 3), 1))
+MODEL_OUTPUT_DAYS = pd.date_range('2020-01-01', '2020-01-10')
+
+
+def write_model_output(root, day, seed=0):
+    """
+    Writes the Model_Output_YYYY-MM-DD.parquet file of one day with random values for MODEL_OUTPUT_CELLS
+    """
+    rng = np.random.default_rng([seed, day.dayofyear])
+    df = pd.DataFrame({'Hexagon_ID': MODEL_OUTPUT_CELLS, 'date': day,
+                       **{column: rng.random(len(MODEL_OUTPUT_CELLS)) for column in rollup_values},
+                       **{f'Normalized {column}': rng.random(len(MODEL_OUTPUT_CELLS)) for column in rollup_values},
+                       'Fire Occurred?': rng.integers(0, 2, len(MODEL_OUTPUT_CELLS)).astype(float)})
+    path = Path(root) / f'Model_Output_{day:%Y-%m-%d}.parquet'
+    pq.write_table(compact_model_output(pa.Table.from_pandas(df, preserve_index=False)), path)
+    return path
+
+
+@pytest.fixture
+def model_output(tmp_path):
+    """
+    Directory of daily model output files for MODEL_OUTPUT_DAYS
+    """
+    root = tmp_path / 'assets'
+    root.mkdir()
+    for day in MODEL_OUTPUT_DAYS:
+        write_model_output(root, day)
+    return root
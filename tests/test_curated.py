@@ -0,0 +1,82 @@
+import shutil
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import h3
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from datalake import Datalake
+from datalake.schema import compact_ghcnd, geoparquet_table
+
+STATIONS = {'USC00000001': (40.0, -105.0), 'USC00000002': (41.0, -104.0), 'CA000000003': (49.0, -110.0)}
+
+
+@pytest.fixture
+def lake(tmp_path):
+    """
+    Datalake holding one clean daily file of 2020: three stations, one row per station for the first days of
+    January to March
+    """
+    rng = np.random.default_rng(0)
+    rows = [(station, month, day) for station in STATIONS for month in (1, 2, 3) for day in range(1, 6)]
+    df = pd.DataFrame(rows, columns=['station_id', 'month', 'day']).assign(year=2020)
+    for column in ['prcp', 'snow', 'snwd', 'tmax', 'tmin', 'awnd', 'awdr', 'evap']:
+        df[column] = rng.integers(-50, 300, len(df)).astype(float)
+    df.loc[::4, 'snow'] = np.nan
+    df['latitude'] = [STATIONS[station][0] for station in df['station_id']]
+    df['longitude'] = [STATIONS[station][1] for station in df['station_id']]
+    df['elevation'] = 1500.0
+    df['state'] = np.where(df['station_id'].str.startswith('US'), 'CO', 'AB')
+    df['Hexagon_ID'] = [h3.str_to_int(h3.latlng_to_cell(lat, lng, 3))
+                        for lat, lng in zip(df['latitude'], df['longitude'])]
+    gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df['latitude'], df['longitude']), crs=4326)
+    gdf = gdf[['station_id', 'year', 'month', 'day', 'prcp', 'snow', 'snwd', 'tmax', 'tmin', 'awnd', 'awdr', 'evap',
+               'latitude', 'longitude', 'elevation', 'state', 'geometry', 'Hexagon_ID']]
+
+    lake = Datalake(tmp_path)
+    lake.years = (2020, 2020)
+    clean_path = tmp_path / lake._daily_artifact(2020)
+    clean_path.parent.mkdir(parents=True)
+    pq.write_table(compact_ghcnd(geoparquet_table(gdf)), clean_path)
+    return lake
+
+
+def query_both_layouts(lake, query):
+    lake.process_ghcnd_curated()
+    curated = lake.query_ghcnd(query)
+    shutil.rmtree(lake.datalake_root / lake.paths['ghcnd_curated_daily'])
+    flat = lake.query_ghcnd(query)
+    key = ['station_id', 'month', 'day']
+    return curated.sort_values(key).reset_index(drop=True), flat.sort_values(key).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('query', [
+    pc.field('year') == 2020,
+    (pc.field('year') == 2020) & (pc.field('month') == 2),
+    pc.field('Hexagon_ID') == h3.str_to_int(h3.latlng_to_cell(40.0, -105.0, 3)),
+])
+def test_curated_query_matches_flat_layout(lake, query):
+    curated, flat = query_both_layouts(lake, query)
+
+    assert len(curated) > 0
+    assert list(curated.columns) == list(flat.columns)
+    assert curated.dtypes.equals(flat.dtypes)
+    pd.testing.assert_frame_equal(curated, flat, check_categorical=False)
+
+
+def test_curated_stations_are_only_rebuilt_when_a_clean_year_changed(lake):
+    lake.process_ghcnd_curated()
+    stations_path = lake.datalake_root / lake.paths['ghcnd_curated_stations']
+    mtime = stations_path.stat().st_mtime_ns
+
+    lake.process_ghcnd_curated()
+
+    assert stations_path.stat().st_mtime_ns == mtime
+    assert len(pq.read_table(stations_path)) == len(STATIONS)
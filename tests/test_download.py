@@ -0,0 +1,136 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from datalake.download import Downloader
+
+CONTENT = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves CONTENT at /file with an ETag, Range and If-Range support like S3. Every other path is a 404.
+    """
+    requests = []
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        RangeHandler.requests.append((self.command, self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+        if self.path != '/file':
+            self.send_error(404)
+            return
+
+        start, status = 0, 200
+        requested = self.headers.get('Range')
+        if requested and self.headers.get('If-Range') in (None, ETAG):
+            start = int(requested.removeprefix('bytes=').rstrip('-'))
+            if start >= len(CONTENT):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(CONTENT)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('ETag', ETAG)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(CONTENT) - start))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}')
+        self.end_headers()
+        if body:
+            self.wfile.write(CONTENT[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clear_requests():
+    RangeHandler.requests.clear()
+
+
+def get_requests():
+    return [request for request in RangeHandler.requests if request[0] == 'GET']
+
+
+def test_resumes_partial_download(server, tmp_path):
+    dest = tmp_path / 'file'
+    (tmp_path / 'file.part').write_bytes(CONTENT[:1000])
+
+    remote = Downloader().fetch(f'{server}/file', dest)
+
+    assert dest.read_bytes() == CONTENT
+    assert remote['etag'] == ETAG
+    assert get_requests() == [('GET', '/file', 'bytes=1000-', ETAG)]
+
+
+def test_if_range_restarts_changed_file(server, tmp_path):
+    dest = tmp_path / 'file'
+    (tmp_path / 'file.part').write_bytes(b'x' * 1000)
+    # Version seen when the partial download started, the server now serves another one and sends the whole file
+    remote = {'etag': '"v0"', 'last_modified': None, 'content_length': len(CONTENT), 'accept_ranges': True}
+
+    Downloader().fetch(f'{server}/file', dest, remote)
+
+    assert dest.read_bytes() == CONTENT
+    assert get_requests() == [('GET', '/file', 'bytes=1000-', '"v0"')]
+
+
+def test_complete_part_is_renamed_without_downloading(server, tmp_path):
+    dest = tmp_path / 'file'
+    (tmp_path / 'file.part').write_bytes(CONTENT)
+
+    Downloader().fetch(f'{server}/file', dest)
+
+    assert dest.read_bytes() == CONTENT
+    assert not (tmp_path / 'file.part').exists()
+    assert get_requests() == []
+
+
+def test_complete_part_answered_416_is_kept(server, tmp_path):
+    dest = tmp_path / 'file'
+    (tmp_path / 'file.part').write_bytes(CONTENT)
+    # Without a known size the range is requested and the server answers 416
+    remote = {'etag': ETAG, 'last_modified': None, 'content_length': None, 'accept_ranges': True}
+
+    Downloader(retries=1).fetch(f'{server}/file', dest, remote)
+
+    assert dest.read_bytes() == CONTENT
+    assert get_requests() == [('GET', '/file', f'bytes={len(CONTENT)}-', ETAG)]
+
+
+def test_sync_all_only_fails_the_failing_file(server, tmp_path):
+    jobs = [(f'{server}/file', tmp_path / 'a' / 'file', None), (f'{server}/missing', tmp_path / 'missing', None)]
+
+    results = {url: result for url, _, result in Downloader(retries=1).sync_all(jobs)}
+
+    assert results[f'{server}/file'][0] == 'downloaded'
+    assert isinstance(results[f'{server}/missing'], Exception)
+    assert (tmp_path / 'a' / 'file').read_bytes() == CONTENT
+
+    # The downloaded file is up to date on the next sync, its size matches and the ETag was recorded
+    results = {url: result for url, _, result in
+               Downloader().sync_all([(f'{server}/file', tmp_path / 'a' / 'file', results[f'{server}/file'][1])])}
+    assert results[f'{server}/file'][0] == 'up to date'
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import h3
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import MODEL_OUTPUT_CELLS, MODEL_OUTPUT_DAYS
+from app.store import HexHistoryStore, MappedModelOutputStore, ModelOutputStore, consolidate_hex_history, \
+    consolidate_model_output
+
+COLUMNS = ['Predicted Fire Probability', 'Fire Occurred?']
+
+
+@pytest.fixture
+def stores(model_output, tmp_path):
+    """
+    The same model output as parquet partitions, a consolidated Arrow file and a hex-major history file
+    """
+    parquet = ModelOutputStore(model_output)
+    mapped = MappedModelOutputStore(consolidate_model_output(model_output, tmp_path / 'model_output.arrow'))
+    history = HexHistoryStore(consolidate_hex_history(parquet, tmp_path / 'hex_history.arrow'))
+    return {'parquet': parquet, 'mapped': mapped, 'history': history}
+
+
+def expected_history(store, hex_ids):
+    days = pd.concat([store.get_day(day) for day in store.dates])
+    rows = days[days['Hexagon_ID'].isin([h3.str_to_int(hex_id) for hex_id in hex_ids])]
+    return rows.sort_values(['date', 'Hexagon_ID'], kind='stable')[['date', *COLUMNS]].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('name', ['parquet', 'mapped', 'history'])
+def test_history_of_one_hexagon(stores, name):
+    hex_id = MODEL_OUTPUT_CELLS[3]
+
+    history = stores[name].get_history([hex_id], columns=COLUMNS)
+
+    assert list(history.columns) == ['date', *COLUMNS]
+    assert history['date'].tolist() == list(MODEL_OUTPUT_DAYS)
+    pd.testing.assert_frame_equal(history.reset_index(drop=True), expected_history(stores['parquet'], [hex_id]))
+
+
+@pytest.mark.parametrize('name', ['parquet', 'mapped', 'history'])
+def test_history_of_several_hexagons_is_in_date_order(stores, name):
+    hex_ids = MODEL_OUTPUT_CELLS[:3]
+
+    history = stores[name].get_history(hex_ids, columns=COLUMNS)
+
+    assert len(history) == len(hex_ids) * len(MODEL_OUTPUT_DAYS)
+    pd.testing.assert_frame_equal(history.reset_index(drop=True), expected_history(stores['parquet'], hex_ids))
+
+
+def test_history_file_slices_each_hexagon(stores):
+    history = stores['history']
+
+    assert history.max_date == MODEL_OUTPUT_DAYS[-1].date()
+    for hex_id in MODEL_OUTPUT_CELLS:
+        rows = history.cells[h3.str_to_int(hex_id)]
+        assert rows.stop - rows.start == len(MODEL_OUTPUT_DAYS)
+    # A hexagon outside the model output has an empty history
+    assert len(history.get_history([h3.latlng_to_cell(10.0, 10.0, 3)], columns=COLUMNS)) == 0
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from datalake import Datalake
+
+
+@pytest.fixture
+def observations():
+    """
+    Long format observations as read from a raw daily file: station-days miss some elements, some elements are
+    not kept and the rows are not sorted
+    """
+    rng = np.random.default_rng(0)
+    rows = []
+    for station in ['USC00000002', 'CA000000003', 'USC00000001', 'MXN00000004']:
+        for date in ['20200105', '20191231', '20200101', '20200229']:
+            for element in ['PRCP', 'SNOW', 'SNWD', 'TMAX', 'TMIN', 'AWND', 'AWDR', 'EVAP', 'WT01', 'TOBS']:
+                if rng.random() < 0.7:
+                    rows.append((station, date, element, float(rng.integers(-100, 500)), None, None, 'S', None))
+    df = pd.DataFrame(rows, columns=['station_id', 'date', 'element', 'value', 'm_flag', 'q_flag', 's_flag', 'time'])
+    return df.sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def test_pivot_matches_merge_chain(observations, tmp_path):
+    lake = Datalake(tmp_path)
+    df = lake.drop_daily_columns(lake.process_dates(observations))
+
+    merged = lake.join_element_tables(lake.create_element_tables(df))
+    pivoted = lake.pivot_elements(df)
+
+    pd.testing.assert_frame_equal(merged, pivoted)
+    assert list(pivoted.columns) == ['station_id', 'year', 'month', 'day', *map(str.lower, lake.ghcnd_elements)]
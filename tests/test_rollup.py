@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import MODEL_OUTPUT_CELLS, write_model_output
+from datalake import Datalake
+from datalake.schema import hexagon_ints
+
+
+def rollup_mtimes(model_output):
+    return {path.name: path.stat().st_mtime_ns for path in (model_output / 'rollups' / 'week').glob('*.parquet')}
+
+
+def test_week_rollup_aggregates_its_days(model_output, tmp_path):
+    Datalake(tmp_path / 'lake').process_rollups(model_output, granularities=['week'])
+
+    # 2020-01-01 to 2020-01-10 touch the weeks starting on Monday 2019-12-30 and 2020-01-06
+    assert sorted(rollup_mtimes(model_output)) == ['Rollup_2019-12-30.parquet', 'Rollup_2020-01-06.parquet']
+    rollup = pq.read_table(model_output / 'rollups' / 'week' / 'Rollup_2020-01-06.parquet').to_pandas()
+    days = pd.concat([pq.read_table(model_output / f'Model_Output_2020-01-{day:02d}.parquet').to_pandas()
+                      for day in range(6, 11)])
+    expected = days.groupby('Hexagon_ID')['Predicted Fire Probability'].agg(['mean', 'max'])
+
+    assert rollup['Hexagon_ID'].tolist() == sorted(hexagon_ints(MODEL_OUTPUT_CELLS).to_pylist())
+    np.testing.assert_allclose(rollup['Predicted Fire Probability (mean)'], expected['mean'], rtol=1e-6)
+    np.testing.assert_allclose(rollup['Predicted Fire Probability (max)'], expected['max'], rtol=1e-6)
+
+
+def test_only_periods_with_changed_days_are_rebuilt(model_output, tmp_path, capsys):
+    lake = Datalake(tmp_path / 'lake')
+    lake.process_rollups(model_output, granularities=['week'])
+    built = rollup_mtimes(model_output)
+    capsys.readouterr()
+
+    lake.process_rollups(model_output, granularities=['week'])
+    assert 'ROLLED UP' not in capsys.readouterr().out
+    assert rollup_mtimes(model_output) == built
+
+    write_model_output(model_output, pd.Timestamp('2020-01-08'), seed=1)
+    lake.process_rollups(model_output, granularities=['week'])
+    rebuilt = rollup_mtimes(model_output)
+
+    assert capsys.readouterr().out.count('ROLLED UP') == 1
+    assert rebuilt['Rollup_2019-12-30.parquet'] == built['Rollup_2019-12-30.parquet']
+    assert rebuilt['Rollup_2020-01-06.parquet'] != built['Rollup_2020-01-06.parquet']
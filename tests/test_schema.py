@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from datalake.schema import compact_ghcnd, compact_model_output, dictionary_type, hexagon_type, value_type
+
+
+def test_ghcnd_values_keep_nulls_and_round():
+    table = pa.table({'prcp': pa.array([0.0, 12.6, np.nan, None, -3.4]), 'station_id': ['a', 'b', 'a', 'b', 'a']})
+
+    compact = compact_ghcnd(table)
+
+    assert compact.schema.field('prcp').type == value_type
+    assert compact.schema.field('station_id').type == dictionary_type
+    assert compact['prcp'].to_pylist() == [0, 13, None, None, -3]
+
+
+def test_out_of_range_values_become_null(capsys):
+    # GHCN-D values are 5 digit fields, 99999 does not fit the int16 value type
+    table = pa.table({'snwd': pa.array([10.0, 99999.0, -40000.0, None]), 'year': pa.array([2020, 2020, 2020, 2020])})
+
+    compact = compact_ghcnd(table)
+
+    assert compact['snwd'].to_pylist() == [10, None, None, None]
+    assert compact['year'].to_pylist() == [2020] * 4
+    assert 'OUT OF RANGE: 2 snwd values' in capsys.readouterr().out
+
+
+def test_model_output_types():
+    table = pa.table({'Hexagon_ID': ['8226affffffffff', None], 'Fire Occurred?': [1.0, 0.0],
+                      'Predicted Fire Probability': [0.25, 0.5], 'year': [2020, 2020]})
+
+    compact = compact_model_output(table)
+
+    assert compact.column_names == ['Hexagon_ID', 'Fire Occurred?', 'Predicted Fire Probability']
+    assert compact.schema.field('Hexagon_ID').type == hexagon_type
+    assert compact['Hexagon_ID'].to_pylist() == [0x8226affffffffff, 0]
+    assert compact.schema.field('Fire Occurred?').type == pa.int8()
+    assert compact.schema.field('Predicted Fire Probability').type == pa.float32()
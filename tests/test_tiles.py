@@ -0,0 +1,66 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from conftest import MODEL_OUTPUT_DAYS, write_model_output
+
+
+@pytest.fixture(scope='module')
+def main(tmp_path_factory):
+    """
+    The dashboard module serving synthetic model output, with its tile cache in a temporary directory
+    """
+    root = tmp_path_factory.mktemp('assets')
+    for day in MODEL_OUTPUT_DAYS:
+        write_model_output(root, day)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('ASSETS_ROOT', str(root))
+        monkeypatch.setenv('TILE_CACHE_PATH', str(tmp_path_factory.mktemp('tiles')))
+        monkeypatch.delenv('LAYER_CACHE_PATH', raising=False)
+        monkeypatch.chdir(Path(__file__).parent.parent / 'src')
+        sys.modules.pop('main', None)
+        yield importlib.import_module('main')
+    sys.modules.pop('main', None)
+
+
+def test_tile_is_rendered_once_under_the_deploy_version(main):
+    client = main.server.test_client()
+    url = main.tile_url('2020-01-05').format(z=6, x=13, y=24)
+
+    response = client.get(url)
+
+    assert url.startswith('/tiles/Predicted%20Fire%20Probability/2020-01-05/6/13/24.png?v=')
+    assert f'v={main.deploy_version}' in url
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(b'\x89PNG')
+    path = main.tile_cache.path('Normalized Predicted Fire Probability', '2020-01-05', 6, 13, 24)
+    assert path.parts[-6] == str(main.deploy_version)
+    assert path.read_bytes() == response.data
+
+
+def test_tile_dates_are_normalized(main):
+    client = main.server.test_client()
+
+    compact = client.get('/tiles/Predicted%20Fire%20Probability/20200105/6/13/24.png')
+    iso = client.get('/tiles/Predicted%20Fire%20Probability/2020-01-05/6/13/24.png')
+
+    assert compact.status_code == iso.status_code == 200
+    assert compact.headers['ETag'] == iso.headers['ETag']
+    assert not (main.tile_cache.root / str(main.deploy_version) / 'Normalized%20Predicted%20Fire%20Probability' /
+                '20200105').exists()
+
+
+@pytest.mark.parametrize('url', [
+    '/tiles/Nope/2020-01-05/6/13/24.png',
+    '/tiles/Predicted%20Fire%20Probability/1999-01-01/6/13/24.png',
+    '/tiles/Predicted%20Fire%20Probability/junk/6/13/24.png',
+    '/tiles/Predicted%20Fire%20Probability/2020-01-05/6/64/24.png',
+    '/tiles/Predicted%20Fire%20Probability/2020-01-05/13/0/0.png',
+])
+def test_invalid_tiles_are_not_found(main, url):
+    assert main.server.test_client().get(url).status_code == 404